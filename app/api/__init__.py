@@ -4,9 +4,10 @@ API router configuration
 
 from fastapi import APIRouter
 from . import connections, sessions, ssh_keys
+from .responses import NoCacheResponse
 
-# Create main API router
-api_router = APIRouter()
+# Create main API router (API responses carry no-cache headers)
+api_router = APIRouter(default_response_class=NoCacheResponse)
 
 # Include sub-routers
 api_router.include_router(
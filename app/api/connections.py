@@ -7,14 +7,20 @@ from fastapi.responses import JSONResponse
 import json
 import asyncio
 import logging
-import uuid
 from typing import Dict
 
-from ..core.database import get_db, SessionRepository
+from ..core.database import get_db, AsyncSessionRepository
 from ..models.session import ConnectionRequest
 from ..services.connection_manager import ConnectionManager
-from ..services.ssh_key_manager import SSHKeyManager
+from ..services.ssh_key_manager import SSHKeyManager, get_ssh_key_manager
 from ..protocols.factory import ConnectionFactory
+from ..utils.ids import new_connection_id
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 router = APIRouter()
 
@@ -23,33 +29,65 @@ connection_manager = ConnectionManager()
 
 logger = logging.getLogger(__name__)
 
+# 合并客户端输入后单次写入连接的最大长度
+INPUT_BATCH_MAX_SIZE = 16 * 1024
+
+
+# 键盘输入消息 {"data":"..."} 的快速路径前后缀（与前端 JSON.stringify 输出一致）
+_DATA_MESSAGE_PREFIX = '{"data":"'
+_DATA_MESSAGE_SUFFIX = '"}'
+
+
+def _extract_plain_data(text: str):
+    """
+    Return the payload of a {"data": "..."} message that needs no JSON unescaping
+    Returns None when the message must go through the full JSON parser
+    """
+    if (len(text) >= len(_DATA_MESSAGE_PREFIX) + len(_DATA_MESSAGE_SUFFIX)
+            and text.startswith(_DATA_MESSAGE_PREFIX)
+            and text.endswith(_DATA_MESSAGE_SUFFIX)):
+        payload = text[len(_DATA_MESSAGE_PREFIX):-len(_DATA_MESSAGE_SUFFIX)]
+        if '\\' not in payload and '"' not in payload:
+            return payload
+    return None
+
+
+async def _receive_batch(queue: asyncio.Queue) -> list:
+    """Wait for one queued item, then take every item that is already available"""
+    batch = [await queue.get()]
+    while True:
+        try:
+            batch.append(queue.get_nowait())
+        except asyncio.QueueEmpty:
+            return batch
+
 
 @router.post("/connect")
 async def initiate_connection(
     connection_request: ConnectionRequest,
-    db: SessionRepository = Depends(get_db)
+    db: AsyncSessionRepository = Depends(get_db),
+    ssh_key_manager: SSHKeyManager = Depends(get_ssh_key_manager)
 ):
     """
     Initiate a new terminal connection
     """
     try:
         # Generate unique connection ID
-        connection_id = str(uuid.uuid4())
+        connection_id = new_connection_id()
 
         # If ssh_key_id is provided, fetch the SSH key and use it
         if connection_request.ssh_key_id:
             try:
-                ssh_key_manager = SSHKeyManager()
                 ssh_key = await ssh_key_manager.get_key_by_id(connection_request.ssh_key_id)
                 if ssh_key:
                     # Override private_key and passphrase with the stored SSH key
                     connection_request.private_key = ssh_key.private_key
                     connection_request.passphrase = ssh_key.passphrase
-                    logger.info(f"Using SSH key: {ssh_key.name} for connection")
+                    logger.info("Using SSH key: %s for connection", ssh_key.name)
                 else:
-                    logger.warning(f"SSH key {connection_request.ssh_key_id} not found, proceeding without it")
+                    logger.warning("SSH key %s not found, proceeding without it", connection_request.ssh_key_id)
             except Exception as key_error:
-                logger.error(f"Failed to load SSH key: {str(key_error)}")
+                logger.error("Failed to load SSH key: %s", key_error)
                 # Continue with connection even if key loading fails
 
         # Create connection based on type
@@ -59,7 +97,7 @@ async def initiate_connection(
         )
 
         # Store connection in manager
-        await connection_manager.add_connection(connection_id, connection)
+        connection_manager.add_connection(connection_id, connection)
 
         # Update session last_used if session_id provided
         if connection_request.session_id:
@@ -73,7 +111,7 @@ async def initiate_connection(
         }
 
     except Exception as e:
-        logger.error(f"Connection failed: {str(e)}")
+        logger.error("Connection failed: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
 
 
@@ -83,11 +121,11 @@ async def websocket_endpoint(websocket: WebSocket, connection_id: str):
     WebSocket endpoint for terminal communication
     """
     await websocket.accept()
-    logger.debug(f"[WEBSOCKET] WebSocket连接开始 {connection_id}")
+    logger.debug("[WEBSOCKET] WebSocket连接开始 %s", connection_id)
 
     try:
         # Get connection from manager
-        connection = await connection_manager.get_connection(connection_id)
+        connection = connection_manager.get_connection(connection_id)
         if not connection:
             await websocket.close(code=4000, reason="Connection not found")
             return
@@ -97,47 +135,110 @@ async def websocket_endpoint(websocket: WebSocket, connection_id: str):
 
         # Send initial data if connection is already established
         # This helps catch any data that was generated before WebSocket connection
-        logger.debug(f"[WEBSOCKET] WebSocket established for connection {connection_id}")
+        logger.debug("[WEBSOCKET] WebSocket established for connection %s", connection_id)
+
+        # Set by whichever handler finishes first
+        done_event = asyncio.Event()
 
         # Start connection tasks
-        async def handle_input():
-            """Handle input from WebSocket"""
-            logger.debug(f"[WEBSOCKET] handle_input开始 {connection_id}")
+        async def receive_messages(inbox: asyncio.Queue):
+            """Move WebSocket messages into the inbox so bursts can be drained at once"""
             try:
                 while True:
                     message_type = await websocket.receive()
+                    await inbox.put(message_type)
+                    if message_type["type"] != "websocket.receive":
+                        break
+            except Exception as e:
+                # 将异常交给 handle_input 处理
+                await inbox.put(e)
+
+        async def handle_input():
+            """Handle input from WebSocket"""
+            logger.debug("[WEBSOCKET] handle_input开始 %s", connection_id)
+            inbox = asyncio.Queue()
+            receiver = asyncio.create_task(receive_messages(inbox))
+
+            # 待合并发送的输入块（同一批中类型相同: bytes 或 str）
+            pending = []
+            pending_size = 0
+
+            async def flush_input():
+                nonlocal pending, pending_size
+                if not pending:
+                    return
+                chunks, pending, pending_size = pending, [], 0
+                if isinstance(chunks[0], bytes):
+                    await connection.send_raw_data(b''.join(chunks))
+                else:
+                    await connection.send_data(''.join(chunks))
 
-                    if message_type["type"] == "websocket.receive":
-                        if "text" in message_type:
-                            # Handle text messages (JSON)
-                            data = message_type["text"]
-                            message = json.loads(data)
-
-                            if "data" in message:
-                                await connection.send_data(message["data"])
-                            elif "resize" in message:
-                                cols, rows = message["resize"]
-                                await connection.resize_terminal(cols, rows)
+            try:
+                finished = False
+                while not finished:
+                    # 粘贴等突发输入会产生大量消息，合并后一次写入连接
+                    for message_type in await _receive_batch(inbox):
+                        if isinstance(message_type, Exception):
+                            await flush_input()
+                            raise message_type
+
+                        if message_type["type"] == "websocket.receive":
+                            if message_type.get("bytes") is not None:
+                                # Binary frames carry raw keystroke bytes
+                                chunk = message_type["bytes"]
+                            elif message_type.get("text") is not None:
+                                # Handle text messages (JSON)
+                                data = message_type["text"]
+
+                                # 快速路径：普通按键输入无需完整解析JSON
+                                chunk = _extract_plain_data(data)
+                                if chunk is None:
+                                    message = _json_loads(data)
+
+                                    if "data" in message:
+                                        chunk = str(message["data"])
+                                    elif "resize" in message:
+                                        # Flush buffered input first to preserve ordering
+                                        await flush_input()
+                                        cols, rows = message["resize"]
+                                        await connection.resize_terminal(cols, rows)
+                                        continue
+                                    else:
+                                        continue
+                            else:
+                                logger.warning("Received unknown message type")
+                                continue
+
+                            if pending and type(pending[0]) is not type(chunk):
+                                await flush_input()
+                            pending.append(chunk)
+                            pending_size += len(chunk)
+                            if pending_size >= INPUT_BATCH_MAX_SIZE:
+                                await flush_input()
+                        elif message_type["type"] == "websocket.disconnect":
+                            # WebSocket disconnect received, break out of loop
+                            logger.debug("[WEBSOCKET] WebSocket disconnect received for connection %s", connection_id)
+                            finished = True
+                            break
                         else:
-                            logger.warning("Received unknown message type")
-                    elif message_type["type"] == "websocket.disconnect":
-                        # WebSocket disconnect received, break out of loop
-                        logger.debug(f"[WEBSOCKET] WebSocket disconnect received for connection {connection_id}")
-                        break
-                    else:
-                        logger.warning(f"Unexpected message type: {message_type['type']}")
-                        break
+                            logger.warning("Unexpected message type: %s", message_type['type'])
+                            finished = True
+                            break
+
+                    await flush_input()
 
             except WebSocketDisconnect:
-                logger.debug(f"[WEBSOCKET] handle_input WebSocketDisconnect {connection_id}")
+                logger.debug("[WEBSOCKET] handle_input WebSocketDisconnect %s", connection_id)
             except Exception as e:
-                logger.error(f"WebSocket input error: {str(e)}")
+                logger.error("WebSocket input error: %s", e)
             finally:
-                logger.debug(f"[WEBSOCKET] handle_input finished for {connection_id}")
+                receiver.cancel()
+                done_event.set()
+                logger.debug("[WEBSOCKET] handle_input finished for %s", connection_id)
 
         async def handle_output():
             """Handle output from connection"""
-            logger.debug(f"[WEBSOCKET] handle_output开始 {connection_id}")
+            logger.debug("[WEBSOCKET] handle_output开始 %s", connection_id)
             try:
                 async for data in connection.read_output():
                     # 检查WebSocket状态，如果已断开则立即退出
@@ -152,66 +253,51 @@ async def websocket_endpoint(websocket: WebSocket, connection_id: str):
                         else:
                             await websocket.send_text(data)
                     except Exception as send_error:
-                        logger.warning(f"Failed to send data to WebSocket: {send_error}")
+                        logger.warning("Failed to send data to WebSocket: %s", send_error)
                         break
 
             except Exception as e:
-                logger.error(f"WebSocket output error: {str(e)}")
+                logger.error("WebSocket output error: %s", e)
             finally:
-                logger.debug(f"[WEBSOCKET] handle_output finished for {connection_id}")
+                done_event.set()
+                logger.debug("[WEBSOCKET] handle_output finished for %s", connection_id)
 
         # Run both tasks concurrently
-        logger.debug(f"[WEBSOCKET] 开始创建任务 {connection_id}")
         input_task = asyncio.create_task(handle_input())
         output_task = asyncio.create_task(handle_output())
 
-        logger.debug(f"[WEBSOCKET] 开始等待任务完成 {connection_id}")
-        done, pending = await asyncio.wait(
-            [input_task, output_task],
-            return_when=asyncio.FIRST_COMPLETED
-        )
+        await done_event.wait()
 
-        logger.debug(f"[WEBSOCKET] 有任务完成，取消剩余任务 {connection_id}")
+        logger.debug("[WEBSOCKET] 有任务完成，取消剩余任务 %s", connection_id)
         # Cancel any remaining tasks
-        for task in pending:
-            task.cancel()
-            try:
-                await task
-            except asyncio.CancelledError:
-                pass
+        for task in (input_task, output_task):
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(input_task, output_task, return_exceptions=True)
 
-        logger.debug(f"[WEBSOCKET] 所有任务已完成 {connection_id}")
+        logger.debug("[WEBSOCKET] 所有任务已完成 %s", connection_id)
 
     except WebSocketDisconnect:
-        logger.debug(f"[WEBSOCKET] WebSocketDisconnect exception at top level for {connection_id}")
+        logger.debug("[WEBSOCKET] WebSocketDisconnect exception at top level for %s", connection_id)
     except Exception as e:
-        logger.error(f"WebSocket error: {str(e)}")
+        logger.error("WebSocket error: %s", e)
     finally:
         # Clean up connection - this will properly close the underlying Telnet/SSH connection
-        logger.debug(f"[WEBSOCKET] 进入finally块 {connection_id}")
-        logger.debug(f"[CLEANUP] 开始清理连接 {connection_id}")
-        logger.debug(f"[CLEANUP] WebSocket状态: {websocket.client_state.name}")
-
+        logger.debug("[CLEANUP] 开始清理连接 %s", connection_id)
         try:
-            logger.debug(f"[CLEANUP] Step 1: Removing connection from connection manager")
             await connection_manager.remove_connection(connection_id)
-            logger.debug(f"[CLEANUP] Step 1: Connection removed successfully")
         except Exception as e:
-            logger.error(f"[CLEANUP] ERROR in Step 1: {str(e)}")
+            logger.error("[CLEANUP] Failed to remove connection: %s", e)
 
         # Gracefully close WebSocket if still connected
         try:
             if websocket.client_state.name == "CONNECTED":
-                logger.debug(f"[CLEANUP] Step 2: Closing WebSocket (state: CONNECTED)")
                 await websocket.close()
-                logger.debug(f"[CLEANUP] Step 2: WebSocket closed successfully")
-            else:
-                logger.debug(f"[CLEANUP] Step 2: WebSocket already closed (state: {websocket.client_state.name})")
         except Exception as e:
             # WebSocket might already be closed, ignore the error
-            logger.debug(f"[CLEANUP] Step 2: WebSocket close error (expected if already closed): {str(e)}")
+            logger.debug("[CLEANUP] WebSocket close error (expected if already closed): %s", e)
 
-        logger.debug(f"[CLEANUP] 连接 {connection_id} 清理完成")
+        logger.debug("[CLEANUP] 连接 %s 清理完成", connection_id)
 
 
 @router.get("/status")
@@ -219,7 +305,7 @@ async def connection_status():
     """
     Get connection status and statistics
     """
-    stats = await connection_manager.get_stats()
+    stats = connection_manager.get_stats()
     return {
         "active_connections": stats["active_connections"],
         "total_connections": stats["total_connections"],
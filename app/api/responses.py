@@ -0,0 +1,25 @@
+"""
+Response classes shared by the API routers
+"""
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+try:
+    import orjson  # noqa: F401
+    DefaultResponse = ORJSONResponse
+except ImportError:
+    DefaultResponse = JSONResponse
+
+# 防止浏览器缓存 API 响应导致数据延迟
+NO_CACHE_HEADERS = {
+    "Cache-Control": "no-store, no-cache, must-revalidate, max-age=0",
+    "Pragma": "no-cache",
+}
+
+
+class NoCacheResponse(DefaultResponse):
+    """JSON response that always carries the no-cache headers"""
+
+    def __init__(self, content=None, status_code=200, headers=None, media_type=None, background=None):
+        headers = {**NO_CACHE_HEADERS, **headers} if headers else NO_CACHE_HEADERS
+        super().__init__(content, status_code, headers, media_type, background)
@@ -4,7 +4,7 @@ Session management API endpoints (updated for native SQLite)
 
 from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Optional
-import uuid
+import logging
 from datetime import datetime
 
 from ..core.database import get_db
@@ -14,10 +14,63 @@ from ..models.session import (
     SessionConfigResponse,
     SessionConfigWithSecrets
 )
-from ..services.crypto import encrypt_data, decrypt_data
+from ..utils.ids import new_session_id
+from ..services.crypto import encrypt_data, encrypt_many_async, decrypt_many_cached, forget_decrypted
 
 router = APIRouter()
 
+logger = logging.getLogger(__name__)
+
+
+# Fields copied from a database row into SessionConfigResponse (never secrets)
+_RESPONSE_FIELDS = (
+    "id", "name", "connection_type", "hostname", "port", "username",
+    "ssh_key_id", "group_name", "encoding", "device", "baud_rate",
+    "created_at", "last_used", "metadata"
+)
+
+# Fields stored encrypted
+_SECRET_FIELDS = ("password", "private_key", "passphrase")
+
+
+def _to_response(session: dict) -> SessionConfigResponse:
+    """
+    Build a response model from a database row
+    Rows are validated (the database may hold values written by older versions or by hand);
+    invalid rows raise ValidationError, which the list/get endpoints turn into warnings/errors
+    """
+    # 只复制响应字段（一次构建字典），密文字段不会进入响应
+    return SessionConfigResponse.model_validate({field: session[field] for field in _RESPONSE_FIELDS})
+
+
+def _to_db_record(session_data: SessionConfigCreate, encrypted: Optional[List[Optional[str]]] = None) -> dict:
+    """
+    Prepare a new session for the database, encrypting secrets
+    encrypted holds already encrypted values for _SECRET_FIELDS (batch creation)
+    """
+    if encrypted is None:
+        encrypted = [encrypt_data(getattr(session_data, field)) for field in _SECRET_FIELDS]
+    password, private_key, passphrase = encrypted
+    return {
+        # Generate unique session ID
+        "id": new_session_id(),
+        "name": session_data.name,
+        "connection_type": session_data.connection_type,
+        "hostname": session_data.hostname,
+        "port": session_data.port,
+        "username": session_data.username,
+        "password": password,
+        "private_key": private_key,
+        "passphrase": passphrase,
+        "ssh_key_id": session_data.ssh_key_id,
+        "group_name": session_data.group_name,
+        "encoding": session_data.encoding,
+        "device": session_data.device,
+        "baud_rate": session_data.baud_rate,
+        # created_at is filled in by SQLite
+        "metadata": session_data.metadata or {}
+    }
+
 
 @router.post("/", response_model=SessionConfigResponse)
 async def create_session(
@@ -28,49 +81,36 @@ async def create_session(
     Create a new session configuration
     """
     try:
-        # Generate unique session ID
-        session_id = str(uuid.uuid4())
-
-        # Prepare session data for database
-        db_session_data = {
-            "id": session_id,
-            "name": session_data.name,
-            "connection_type": session_data.connection_type,
-            "hostname": session_data.hostname,
-            "port": session_data.port,
-            "username": session_data.username,
-            "password": encrypt_data(session_data.password) if session_data.password else None,
-            "private_key": encrypt_data(session_data.private_key) if session_data.private_key else None,
-            "passphrase": encrypt_data(session_data.passphrase) if session_data.passphrase else None,
-            "ssh_key_id": session_data.ssh_key_id,
-            "group_name": session_data.group_name,
-            "encoding": session_data.encoding,
-            "device": session_data.device,
-            "baud_rate": session_data.baud_rate,
-            "created_at": datetime.utcnow().isoformat(),
-            "metadata": session_data.metadata or {}
-        }
-
         # Create session in database
-        created_session = db.create(db_session_data)
+        created_session = await db.create(_to_db_record(session_data))
 
         # Convert to response model (exclude sensitive data)
-        return SessionConfigResponse(
-            id=created_session["id"],
-            name=created_session["name"],
-            connection_type=created_session["connection_type"],
-            hostname=created_session["hostname"],
-            port=created_session["port"],
-            username=created_session["username"],
-            ssh_key_id=created_session.get("ssh_key_id"),
-            group_name=created_session["group_name"],
-            encoding=created_session["encoding"],
-            device=created_session.get("device"),
-            baud_rate=created_session.get("baud_rate"),
-            created_at=created_session["created_at"],
-            last_used=created_session["last_used"],
-            metadata=created_session["metadata"]
+        return _to_response(created_session)
+
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/bulk", response_model=List[SessionConfigResponse])
+async def create_sessions_bulk(
+    sessions_data: List[SessionConfigCreate],
+    db=Depends(get_db)
+):
+    """
+    Create multiple session configurations in one transaction
+    """
+    try:
+        # 所有会话的密文一次性在线程池中加密，不阻塞事件循环
+        count = len(_SECRET_FIELDS)
+        encrypted = await encrypt_many_async(
+            getattr(data, field) for data in sessions_data for field in _SECRET_FIELDS
         )
+        records = [
+            _to_db_record(data, encrypted[index * count:(index + 1) * count])
+            for index, data in enumerate(sessions_data)
+        ]
+        created_sessions = await db.create_many(records)
+        return [_to_response(session) for session in created_sessions]
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -85,33 +125,16 @@ async def list_sessions(
     """
     List all session configurations
     """
-    sessions = db.get_all(group_name=group_name, connection_type=connection_type)
+    sessions = await db.get_all(group_name=group_name, connection_type=connection_type)
 
     # 容错处理：过滤无效的会话配置
     valid_sessions = []
     for session in sessions:
         try:
-            valid_sessions.append(
-                SessionConfigResponse(
-                    id=session["id"],
-                    name=session["name"],
-                    connection_type=session["connection_type"],
-                    hostname=session["hostname"],
-                    port=session["port"],
-                    username=session["username"],
-                    ssh_key_id=session.get("ssh_key_id"),
-                    group_name=session["group_name"],
-                    encoding=session.get("encoding", "utf-8"),
-                    device=session.get("device"),
-                    baud_rate=session.get("baud_rate"),
-                    created_at=session["created_at"],
-                    last_used=session["last_used"],
-                    metadata=session["metadata"]
-                )
-            )
+            valid_sessions.append(_to_response(session))
         except Exception as e:
             # 记录警告但不中断
-            print(f"⚠️ 跳过无效会话配置 [{session.get('id', 'unknown')}]: {e}")
+            logger.warning("跳过无效会话配置 [%s]: %s", session.get('id', 'unknown'), e)
             continue
     
     return valid_sessions
@@ -125,31 +148,16 @@ async def get_session(
     """
     Get a specific session configuration
     """
-    session = db.get_by_id(session_id)
+    session = await db.get_by_id(session_id)
 
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
     # 容错处理：如果数据无效，返回错误而不是崩溃
     try:
-        return SessionConfigResponse(
-            id=session["id"],
-            name=session["name"],
-            connection_type=session["connection_type"],
-            hostname=session["hostname"],
-            port=session["port"],
-            username=session["username"],
-            ssh_key_id=session.get("ssh_key_id"),
-            group_name=session["group_name"],
-            encoding=session["encoding"],
-            device=session.get("device"),
-            baud_rate=session.get("baud_rate"),
-            created_at=session["created_at"],
-            last_used=session["last_used"],
-            metadata=session["metadata"]
-        )
+        return _to_response(session)
     except Exception as e:
-        print(f"⚠️ 会话配置数据无效 [{session_id}]: {e}")
+        logger.warning("会话配置数据无效 [%s]: %s", session_id, e)
         raise HTTPException(status_code=500, detail=f"会话配置数据无效: {e}")
 
 
@@ -162,7 +170,7 @@ async def update_session(
     """
     Update a session configuration
     """
-    session = db.get_by_id(session_id)
+    session = await db.get_by_id(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
@@ -181,27 +189,15 @@ async def update_session(
                 update_data[key] = value
 
         # Update session
-        updated_session = db.update(session_id, update_data)
+        updated_session = await db.update(session_id, update_data)
 
         if not updated_session:
             raise HTTPException(status_code=404, detail="Session not found")
 
-        return SessionConfigResponse(
-            id=updated_session["id"],
-            name=updated_session["name"],
-            connection_type=updated_session["connection_type"],
-            hostname=updated_session["hostname"],
-            port=updated_session["port"],
-            username=updated_session["username"],
-            ssh_key_id=updated_session.get("ssh_key_id"),
-            group_name=updated_session["group_name"],
-            encoding=updated_session.get("encoding", "utf-8"),
-            device=updated_session.get("device"),
-            baud_rate=updated_session.get("baud_rate"),
-            created_at=updated_session["created_at"],
-            last_used=updated_session["last_used"],
-            metadata=updated_session["metadata"]
-        )
+        # 被替换的旧密文不再需要缓存的明文
+        forget_decrypted(session[field] for field in _SECRET_FIELDS if field in update_data)
+
+        return _to_response(updated_session)
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -215,11 +211,16 @@ async def delete_session(
     """
     Delete a session configuration
     """
-    success = db.delete(session_id)
+    session = await db.get_by_id(session_id)
+    success = await db.delete(session_id)
 
     if not success:
         raise HTTPException(status_code=404, detail="Session not found")
 
+    # 已删除会话的明文不应继续留在解密缓存中
+    if session:
+        forget_decrypted(session[field] for field in _SECRET_FIELDS)
+
     return {"message": "Session deleted successfully"}
 
 
@@ -231,16 +232,17 @@ async def use_session(
     """
     Mark session as used and return decrypted connection data
     """
-    session = db.get_by_id(session_id)
+    session = await db.get_by_id(session_id)
 
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
     try:
         # Update last_used timestamp
-        db.update_last_used(session_id)
+        await db.update_last_used(session_id)
 
-        # Return decrypted connection data
+        # Return decrypted connection data (all secrets in one cached batch)
+        password, private_key, passphrase = decrypt_many_cached(session[field] for field in _SECRET_FIELDS)
         return SessionConfigWithSecrets(
             id=session["id"],
             name=session["name"],
@@ -248,9 +250,9 @@ async def use_session(
             hostname=session["hostname"],
             port=session["port"],
             username=session["username"],
-            password=decrypt_data(session["password"]) if session["password"] else None,
-            private_key=decrypt_data(session["private_key"]) if session["private_key"] else None,
-            passphrase=decrypt_data(session["passphrase"]) if session["passphrase"] else None,
+            password=password,
+            private_key=private_key,
+            passphrase=passphrase,
             ssh_key_id=session.get("ssh_key_id"),
             group_name=session["group_name"],
             encoding=session.get("encoding", "utf-8"),
@@ -270,7 +272,7 @@ async def list_groups(db=Depends(get_db)):
     """
     List all available groups
     """
-    groups = db.get_groups()
+    groups = await db.get_groups()
     return {"groups": groups}
 
 
@@ -282,7 +284,7 @@ async def export_sessions(
     """
     Export sessions (without sensitive data) for backup
     """
-    sessions = db.get_all(group_name=group_name)
+    sessions = await db.get_all(group_name=group_name)
 
     export_data = []
     for session in sessions:
@@ -2,7 +2,7 @@
 SSH Keys API endpoints
 """
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Depends, status
 from typing import List
 
 from ..models.ssh_key import (
@@ -11,14 +11,16 @@ from ..models.ssh_key import (
     SSHKeyResponse,
     SSHKeyWithSecret
 )
-from ..services.ssh_key_manager import SSHKeyManager
+from ..services.ssh_key_manager import SSHKeyManager, get_ssh_key_manager
 
 router = APIRouter()
-key_manager = SSHKeyManager()
 
 
 @router.post("", response_model=SSHKeyResponse, status_code=status.HTTP_201_CREATED)
-async def create_ssh_key(key_data: SSHKeyCreate):
+async def create_ssh_key(
+    key_data: SSHKeyCreate,
+    key_manager: SSHKeyManager = Depends(get_ssh_key_manager)
+):
     """Create a new SSH key"""
     try:
         return await key_manager.create_key(key_data)
@@ -35,7 +37,9 @@ async def create_ssh_key(key_data: SSHKeyCreate):
 
 
 @router.get("", response_model=List[SSHKeyResponse])
-async def get_all_ssh_keys():
+async def get_all_ssh_keys(
+    key_manager: SSHKeyManager = Depends(get_ssh_key_manager)
+):
     """Get all SSH keys (without private keys)"""
     try:
         return await key_manager.get_all_keys()
@@ -47,7 +51,10 @@ async def get_all_ssh_keys():
 
 
 @router.get("/{key_id}", response_model=SSHKeyResponse)
-async def get_ssh_key(key_id: str):
+async def get_ssh_key(
+    key_id: str,
+    key_manager: SSHKeyManager = Depends(get_ssh_key_manager)
+):
     """Get SSH key by ID (without private key)"""
     try:
         key = await key_manager.get_key_response(key_id)
@@ -67,7 +74,10 @@ async def get_ssh_key(key_id: str):
 
 
 @router.get("/{key_id}/secret", response_model=SSHKeyWithSecret)
-async def get_ssh_key_with_secret(key_id: str):
+async def get_ssh_key_with_secret(
+    key_id: str,
+    key_manager: SSHKeyManager = Depends(get_ssh_key_manager)
+):
     """Get SSH key with private key (for connection use)"""
     try:
         key = await key_manager.get_key_by_id(key_id)
@@ -91,7 +101,11 @@ async def get_ssh_key_with_secret(key_id: str):
 
 
 @router.put("/{key_id}", response_model=SSHKeyResponse)
-async def update_ssh_key(key_id: str, key_data: SSHKeyUpdate):
+async def update_ssh_key(
+    key_id: str,
+    key_data: SSHKeyUpdate,
+    key_manager: SSHKeyManager = Depends(get_ssh_key_manager)
+):
     """Update SSH key"""
     try:
         key = await key_manager.update_key(key_id, key_data)
@@ -116,7 +130,10 @@ async def update_ssh_key(key_id: str, key_data: SSHKeyUpdate):
 
 
 @router.delete("/{key_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_ssh_key(key_id: str):
+async def delete_ssh_key(
+    key_id: str,
+    key_manager: SSHKeyManager = Depends(get_ssh_key_manager)
+):
     """Delete SSH key"""
     try:
         success = await key_manager.delete_key(key_id)
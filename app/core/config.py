@@ -5,23 +5,88 @@ JSON-based configuration with environment variable override
 
 import json
 import os
+import sys
+import threading
 from typing import List, Any, Dict
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Candidate config.json locations, first match wins
+CONFIG_PATHS = (
+    "config.json",
+    "app/config.json",
+    "../config.json"
+)
+
+# ENVIRONMENT=production 时 PBKDF2_ITERATIONS 的下限
+MIN_PRODUCTION_PBKDF2_ITERATIONS = 100000
+
 
 class Settings:
     """Application settings loaded from JSON config and environment variables"""
 
+    # Known configuration keys, stored as plain instance attributes
+    HOST: str
+    PORT: int
+    DEBUG: bool
+    USE_UVLOOP: bool
+    SECRET_KEY: str
+    PBKDF2_ITERATIONS: int
+    ALLOWED_ORIGINS: List[str]
+    PRODUCTION_ALLOWED_ORIGINS: List[str]
+    DATABASE_URL: str
+    SSH_TIMEOUT: int
+    TELNET_TIMEOUT: int
+    SSH_POOL_MAX_IDLE: int
+    SSH_POOL_IDLE_TIMEOUT: int
+    MAX_CONNECTIONS_PER_CLIENT: int
+    OUTPUT_BUFFER_MAX_SIZE: int
+    OUTPUT_DROP_OLDEST: bool
+    OUTPUT_FLUSH_DELAY: float
+    SERIAL_BINARY_PASSTHROUGH: bool
+    SESSION_EXPIRE_SECONDS: int
+    ALLOW_SYSTEM_HOST_KEYS: bool
+    VERIFY_HOST_KEYS: bool
+    DEFAULT_ENCODING: str
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(Settings, cls).__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
     def __init__(self):
+        if self._initialized:
+            return
+
         # Default configuration
         self._defaults = {
             # Server settings
             "HOST": "0.0.0.0",
             "PORT": 8080,
             "DEBUG": False,
+            "USE_UVLOOP": sys.platform != "win32",  # Windows 不支持 uvloop
 
             # Security settings
             "SECRET_KEY": "your-secret-key-change-in-production",
+            # 由 SECRET_KEY 派生加密密钥的 PBKDF2 迭代次数；修改后已加密的数据无法解密，
+            # 仅用于开发/测试环境调低（生产环境不低于 MIN_PRODUCTION_PBKDF2_ITERATIONS）
+            "PBKDF2_ITERATIONS": 100000,
             "ALLOWED_ORIGINS": ["*"],
+            # ENVIRONMENT=production 且未显式配置 ALLOWED_ORIGINS 时使用
+            "PRODUCTION_ALLOWED_ORIGINS": [
+                "http://localhost:8080",
+                "https://yourdomain.com"
+            ],
 
             # Database settings
             "DATABASE_URL": "sqlite:///./data/webxterm.db",
@@ -29,7 +94,13 @@ class Settings:
             # Connection settings
             "SSH_TIMEOUT": 10,
             "TELNET_TIMEOUT": 10,
+            "SSH_POOL_MAX_IDLE": 2,  # 每个 (主机, 端口, 用户, 凭据) 保留的空闲 SSH 连接数（0 表示不复用）
+            "SSH_POOL_IDLE_TIMEOUT": 60,  # 空闲 SSH 连接保留时间（秒）
             "MAX_CONNECTIONS_PER_CLIENT": 10,
+            "OUTPUT_BUFFER_MAX_SIZE": 64 * 1024,  # 每个连接输出缓冲区上限（字符/字节），满时读取端等待（0 表示不限制）
+            "OUTPUT_DROP_OLDEST": False,  # 缓冲区满时丢弃最早的输出而不是让读取端等待（会丢失终端内容，适合无法背压的串口日志）
+            "OUTPUT_FLUSH_DELAY": 0.005,  # 输出合并等待时间（秒）
+            "SERIAL_BINARY_PASSTHROUGH": False,  # 串口输出不解码，直接以二进制帧发送给前端
 
             # Session settings
             "SESSION_EXPIRE_SECONDS": 3600,
@@ -45,43 +116,43 @@ class Settings:
         # Load configuration
         self._config = self._load_config()
 
+        # 将配置项直接写入实例属性，避免每次访问都经过 __getattr__
+        self._sync_attributes(self._config)
+        self._initialized = True
+
     def _load_config(self) -> Dict[str, Any]:
         """Load configuration from JSON file with fallback to defaults"""
         config = self._defaults.copy()
+        json_config = {}
 
-        # Try to load from config.json
-        config_paths = [
-            "config.json",
-            "app/config.json",
-            "../config.json"
-        ]
-
-        for config_path in config_paths:
+        # Try to load from config.json (open directly instead of exists() + open())
+        for config_path in CONFIG_PATHS:
             try:
-                if os.path.exists(config_path):
-                    with open(config_path, 'r', encoding='utf-8') as f:
-                        json_config = json.load(f)
-                        config.update(json_config)
-                        print(f"Configuration loaded from: {config_path}")
-                        break
+                with open(config_path, 'rb') as f:
+                    loaded_config = _json_loads(f.read())
+                config.update(loaded_config)
+                json_config = loaded_config
+                print(f"Configuration loaded from: {config_path}")
+                break
+            except FileNotFoundError:
+                continue
             except (json.JSONDecodeError, IOError) as e:
                 print(f"Failed to load config from {config_path}: {e}")
                 continue
 
-        # Override with environment variables
-        for key in config.keys():
-            env_value = os.getenv(key)
-            if env_value is not None:
-                config[key] = self._parse_env_value(env_value, type(config[key]))
+        # Override with environment variables (single pass over the known keys present in os.environ)
+        env_overrides = {key: os.environ[key] for key in config.keys() & os.environ.keys()}
+        for key, env_value in env_overrides.items():
+            config[key] = self._parse_env_value(env_value, type(config[key]))
 
         # Handle special environment variable
         environment = os.getenv("ENVIRONMENT", "development")
         if environment == "production":
             config["DEBUG"] = False
-            config["ALLOWED_ORIGINS"] = [
-                "http://localhost:8080",
-                "https://yourdomain.com"
-            ]
+            config["PBKDF2_ITERATIONS"] = max(config["PBKDF2_ITERATIONS"], MIN_PRODUCTION_PBKDF2_ITERATIONS)
+            # Keep origins set explicitly in config.json or the environment
+            if "ALLOWED_ORIGINS" not in json_config and "ALLOWED_ORIGINS" not in env_overrides:
+                config["ALLOWED_ORIGINS"] = config["PRODUCTION_ALLOWED_ORIGINS"]
         elif environment == "development":
             config["DEBUG"] = True
 
@@ -112,12 +183,18 @@ class Settings:
         else:
             return value
 
+    def _sync_attributes(self, values: Dict[str, Any]) -> None:
+        """Mirror configuration values into instance attributes (never shadowing methods)"""
+        for key, value in values.items():
+            if not hasattr(type(self), key):
+                self.__dict__[key] = value
+
     def get(self, key: str, default: Any = None) -> Any:
         """Get configuration value"""
         return self._config.get(key, default)
 
     def __getattr__(self, name: str) -> Any:
-        """Allow attribute-style access to configuration"""
+        """Fallback for configuration keys not loaded as instance attributes"""
         if name.startswith('_'):
             raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
         return self._config.get(name, self._defaults.get(name))
@@ -125,63 +202,12 @@ class Settings:
     def update(self, updates: Dict[str, Any]) -> None:
         """Update configuration at runtime"""
         self._config.update(updates)
+        self._sync_attributes(updates)
 
     def to_dict(self) -> Dict[str, Any]:
         """Return configuration as dictionary"""
         return self._config.copy()
 
-    @property
-    def HOST(self) -> str:
-        return self._config["HOST"]
-
-    @property
-    def PORT(self) -> int:
-        return self._config["PORT"]
-
-    @property
-    def DEBUG(self) -> bool:
-        return self._config["DEBUG"]
-
-    @property
-    def SECRET_KEY(self) -> str:
-        return self._config["SECRET_KEY"]
-
-    @property
-    def ALLOWED_ORIGINS(self) -> List[str]:
-        return self._config["ALLOWED_ORIGINS"]
-
-    @property
-    def DATABASE_URL(self) -> str:
-        return self._config["DATABASE_URL"]
-
-    @property
-    def SSH_TIMEOUT(self) -> int:
-        return self._config["SSH_TIMEOUT"]
-
-    @property
-    def TELNET_TIMEOUT(self) -> int:
-        return self._config["TELNET_TIMEOUT"]
-
-    @property
-    def MAX_CONNECTIONS_PER_CLIENT(self) -> int:
-        return self._config["MAX_CONNECTIONS_PER_CLIENT"]
-
-    @property
-    def SESSION_EXPIRE_SECONDS(self) -> int:
-        return self._config["SESSION_EXPIRE_SECONDS"]
-
-    @property
-    def ALLOW_SYSTEM_HOST_KEYS(self) -> bool:
-        return self._config["ALLOW_SYSTEM_HOST_KEYS"]
-
-    @property
-    def VERIFY_HOST_KEYS(self) -> bool:
-        return self._config["VERIFY_HOST_KEYS"]
-
-    @property
-    def DEFAULT_ENCODING(self) -> str:
-        return self._config["DEFAULT_ENCODING"]
-
 
 # Global settings instance
 settings = Settings()
@@ -5,40 +5,57 @@ Native SQLite database management
 import sqlite3
 import json
 import os
+import sys
 import asyncio
 import threading
-from typing import Optional, Dict, List, Any
-from datetime import datetime
+from typing import Optional, Dict, List, Any, Iterable, Iterator
 from contextlib import contextmanager
 
 from .config import settings
 
+try:
+    import orjson
+    _json_loads = orjson.loads
 
-class DatabaseManager:
-    """Simple SQLite database manager using built-in sqlite3"""
+    def _json_dumps(value) -> str:
+        return orjson.dumps(value).decode('utf-8')
+except ImportError:
+    _json_loads = json.loads
+    _json_dumps = json.dumps
 
-    _instance = None
-    _lock = threading.Lock()
+# SQLite expression producing an ISO-8601 UTC timestamp (millisecond precision)
+SQL_NOW_ISO = "strftime('%Y-%m-%dT%H:%M:%f', 'now')"
 
-    def __new__(cls):
-        if cls._instance is None:
-            with cls._lock:
-                if cls._instance is None:
-                    cls._instance = super(DatabaseManager, cls).__new__(cls)
-                    cls._instance._initialized = False
-        return cls._instance
+# Schema version stored in PRAGMA user_version
+# 4: password/private_key/passphrase 列统一为 "gcm:" + base64(nonce + 密文)，不再保存双重 base64 的 Fernet 令牌
+SCHEMA_VERSION = 4
 
-    def __init__(self):
-        if self._initialized:
-            return
+# Columns holding encrypted secrets
+SECRET_COLUMNS = ('password', 'private_key', 'passphrase')
+
+# INSERT/UPDATE ... RETURNING requires SQLite 3.35+
+SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
 
+
+class DatabaseManager:
+    """
+    Simple SQLite database manager using built-in sqlite3
+    Use the module-level db_manager instance instead of constructing new ones
+    """
+
+    def __init__(self):
         # Extract database path from URL
         if settings.DATABASE_URL.startswith('sqlite:///'):
             self.db_path = settings.DATABASE_URL[10:]  # Remove 'sqlite:///'
         else:
             self.db_path = "data/webxterm.db"
 
-        self._initialized = True
+        # dict 绑定参数自动序列化为 JSON 文本（metadata 列）
+        sqlite3.register_adapter(dict, _json_dumps)
+
+        # Per-thread connection cache
+        self._local = threading.local()
+
         self._ensure_directory()
 
     def _ensure_directory(self):
@@ -47,129 +64,246 @@ class DatabaseManager:
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir, exist_ok=True)
 
+    def _is_memory_db(self) -> bool:
+        """Check whether the database lives in memory (no journal tuning needed)"""
+        return self.db_path == ':memory:'
+
+    def _apply_pragmas(self, conn: sqlite3.Connection):
+        """Apply per-connection performance settings"""
+        if self._is_memory_db():
+            return
+        conn.execute("PRAGMA synchronous=NORMAL")   # WAL 模式下安全，每次提交少一次 fsync
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")    # 约 20MB 页缓存
+        conn.execute("PRAGMA busy_timeout=30000")   # 锁冲突时等待而不是立即报错
+        if sys.platform != "win32":
+            conn.execute("PRAGMA mmap_size=268435456")  # 256MB 内存映射读取（SQLite 按文件大小截断）
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new configured connection"""
+        conn = sqlite3.connect(self.db_path, cached_statements=256)
+        conn.row_factory = sqlite3.Row  # Enable dict-like access
+        self._apply_pragmas(conn)
+        return conn
+
     @contextmanager
     def get_connection(self):
-        """Get database connection with automatic cleanup"""
-        conn = None
+        """Get this thread's pooled database connection, rolling back on error"""
+        # 每个线程复用一个连接（sqlite3 连接默认不能跨线程使用），避免每次查询重新打开文件
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row  # Enable dict-like access
             yield conn
-        except Exception as e:
-            if conn:
-                conn.rollback()
-            raise e
-        finally:
-            if conn:
-                conn.close()
+        except Exception:
+            conn.rollback()
+            raise
 
     def init_database(self):
         """Initialize database tables"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
 
-            # Create session_configs table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS session_configs (
-                    id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    connection_type TEXT NOT NULL,
-                    hostname TEXT NOT NULL,
-                    port INTEGER NOT NULL,
-                    username TEXT NOT NULL,
-                    password TEXT,
-                    private_key TEXT,
-                    passphrase TEXT,
-                    ssh_key_id TEXT,
-                    group_name TEXT,
-                    encoding TEXT DEFAULT 'utf-8',
-                    created_at TEXT NOT NULL,
-                    last_used TEXT,
-                    metadata TEXT
-                )
-            """)
-
-            # Create indexes for better performance
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_session_name
-                ON session_configs(name)
-            """)
-
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_session_group
-                ON session_configs(group_name)
-            """)
-
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_session_last_used
-                ON session_configs(last_used)
-            """)
-
-            # Migration: Add ssh_key_id column if it doesn't exist
-            cursor.execute("PRAGMA table_info(session_configs)")
-            columns = [row[1] for row in cursor.fetchall()]
-
-            if 'ssh_key_id' not in columns:
-                cursor.execute("ALTER TABLE session_configs ADD COLUMN ssh_key_id TEXT")
+            # WAL 模式持久化在数据库文件上，只需设置一次；读写可以并发进行
+            if not self._is_memory_db():
+                cursor.execute("PRAGMA journal_mode=WAL")
+
+            # 通过 user_version 记录已应用的结构版本，已是最新时跳过所有建表/迁移语句
+            version = cursor.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
+
+            if version < 2:
+                # Create session_configs table (full current schema)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS session_configs (
+                        id TEXT PRIMARY KEY,
+                        name TEXT NOT NULL,
+                        connection_type TEXT NOT NULL,
+                        hostname TEXT NOT NULL,
+                        port INTEGER NOT NULL,
+                        username TEXT NOT NULL,
+                        password TEXT,
+                        private_key TEXT,
+                        passphrase TEXT,
+                        ssh_key_id TEXT,
+                        group_name TEXT,
+                        encoding TEXT DEFAULT 'utf-8',
+                        created_at TEXT NOT NULL,
+                        last_used TEXT,
+                        metadata TEXT,
+                        device TEXT,
+                        baud_rate INTEGER
+                    )
+                """)
+
+                # Create indexes for better performance
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_session_name
+                    ON session_configs(name)
+                """)
+
+                # Migration: add columns missing from databases created by older versions
+                for column_sql in (
+                    "ssh_key_id TEXT",
+                    "encoding TEXT DEFAULT 'utf-8'",
+                    "device TEXT",
+                    "baud_rate INTEGER",
+                ):
+                    try:
+                        cursor.execute(f"ALTER TABLE session_configs ADD COLUMN {column_sql}")
+                    except sqlite3.OperationalError:
+                        # duplicate column name: already migrated
+                        pass
+
+            if version < 3:
+                # 复合索引覆盖 get_all 的过滤 + 排序，避免临时 B-tree 排序
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_session_filter_sort
+                    ON session_configs(group_name, connection_type, last_used DESC, created_at DESC)
+                """)
+
+                # 部分索引与 get_groups 的 WHERE 条件完全一致，只需扫描索引
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_session_groups
+                    ON session_configs(group_name)
+                    WHERE group_name IS NOT NULL AND group_name != ''
+                """)
+
+                # Superseded by the indexes above
+                cursor.execute("DROP INDEX IF EXISTS idx_session_group")
+                cursor.execute("DROP INDEX IF EXISTS idx_session_last_used")
+
+                # Refresh planner statistics for the new indexes
+                cursor.execute("ANALYZE")
+
+            if version < 4:
+                self._upgrade_legacy_secrets(cursor)
+
+            cursor.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+            conn.commit()
 
-            if 'encoding' not in columns:
-                cursor.execute("ALTER TABLE session_configs ADD COLUMN encoding TEXT DEFAULT 'utf-8'")
 
-            if 'device' not in columns:
-                cursor.execute("ALTER TABLE session_configs ADD COLUMN device TEXT")
+    def _upgrade_legacy_secrets(self, cursor: sqlite3.Cursor):
+        """Rewrite legacy Fernet secrets in the current AES-GCM format (one-time migration)"""
+        # 延迟导入：crypto 依赖 core.config，避免 core 在导入时依赖 services
+        from ..services.crypto import upgrade_ciphertext
 
-            if 'baud_rate' not in columns:
-                cursor.execute("ALTER TABLE session_configs ADD COLUMN baud_rate INTEGER")
+        columns = ', '.join(SECRET_COLUMNS)
+        updates = []
+        for row in cursor.execute(f"SELECT id, {columns} FROM session_configs").fetchall():
+            values = [upgrade_ciphertext(row[column]) for column in SECRET_COLUMNS]
+            if any(values):
+                # 无需升级（或无法解密，保留原值由 decrypt 的兼容分支处理）的列保持不变
+                updates.append(tuple(
+                    new if new is not None else row[column]
+                    for new, column in zip(values, SECRET_COLUMNS)
+                ) + (row['id'],))
 
-            conn.commit()
+        if updates:
+            assignments = ', '.join(f"{column} = ?" for column in SECRET_COLUMNS)
+            cursor.executemany(f"UPDATE session_configs SET {assignments} WHERE id = ?", updates)
 
 
 # Database operations
 class SessionRepository:
     """Repository for session CRUD operations"""
 
-    def __init__(self):
-        self.db = DatabaseManager()
+    # Columns that update() may set
+    _ALLOWED_UPDATE_COLS = frozenset({
+        'name', 'connection_type', 'hostname', 'port', 'username',
+        'password', 'private_key', 'passphrase', 'ssh_key_id', 'group_name',
+        'encoding', 'device', 'baud_rate', 'metadata'
+    })
+
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+        # Sorted column tuple -> UPDATE statement
+        self._update_sql_cache: Dict[tuple, str] = {}
+
+    # Rows per executemany call in create_many
+    BULK_INSERT_CHUNK_SIZE = 500
+
+    _INSERT_SQL = f"""
+        INSERT INTO session_configs
+        (id, name, connection_type, hostname, port, username,
+         password, private_key, passphrase, ssh_key_id, group_name,
+         created_at, last_used, metadata, encoding, device, baud_rate)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, {SQL_NOW_ISO}), ?, ?, ?, ?, ?)
+    """
+
+    def _insert_params(self, session_data: Dict[str, Any]) -> tuple:
+        """Build the INSERT parameter tuple for one session"""
+        return (
+            session_data['id'],
+            session_data['name'],
+            session_data['connection_type'],
+            session_data['hostname'],
+            session_data['port'],
+            session_data['username'],
+            session_data.get('password'),
+            session_data.get('private_key'),
+            session_data.get('passphrase'),
+            session_data.get('ssh_key_id'),
+            session_data.get('group_name'),
+            session_data.get('created_at'),
+            session_data.get('last_used'),
+            session_data.get('metadata') or None,  # dict is serialized by the adapter
+            session_data.get('encoding', 'utf-8'),
+            session_data.get('device'),
+            session_data.get('baud_rate')
+        )
 
     def create(self, session_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new session"""
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
 
-            # Convert metadata to JSON string if present
-            metadata_json = None
-            if session_data.get('metadata'):
-                metadata_json = json.dumps(session_data['metadata'])
-
-            cursor.execute("""
-                INSERT INTO session_configs
-                (id, name, connection_type, hostname, port, username,
-                 password, private_key, passphrase, ssh_key_id, group_name,
-                 created_at, last_used, metadata, encoding, device, baud_rate)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                session_data['id'],
-                session_data['name'],
-                session_data['connection_type'],
-                session_data['hostname'],
-                session_data['port'],
-                session_data['username'],
-                session_data.get('password'),
-                session_data.get('private_key'),
-                session_data.get('passphrase'),
-                session_data.get('ssh_key_id'),
-                session_data.get('group_name'),
-                session_data['created_at'],
-                session_data.get('last_used'),
-                metadata_json,
-                session_data.get('encoding', 'utf-8'),
-                session_data.get('device'),
-                session_data.get('baud_rate')
-            ))
+            if SUPPORTS_RETURNING:
+                # 一条语句完成插入并返回整行，无需再查询一次
+                cursor.execute(self._INSERT_SQL + " RETURNING *", self._insert_params(session_data))
+                row = cursor.fetchone()
+                conn.commit()
+                return self._row_to_dict(row)
+
+            cursor.execute(self._INSERT_SQL, self._insert_params(session_data))
 
             conn.commit()
             return self.get_by_id(session_data['id'])
 
+    def create_many(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Create many sessions in a single transaction"""
+        if not rows:
+            return []
+
+        params = [self._insert_params(row) for row in rows]
+        ids = [row['id'] for row in rows]
+        chunk_size = self.BULK_INSERT_CHUNK_SIZE
+
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+
+            # 所有分块共用一个事务，只提交（fsync）一次
+            for i in range(0, len(params), chunk_size):
+                cursor.executemany(self._INSERT_SQL, params[i:i + chunk_size])
+
+            conn.commit()
+
+            created = []
+            for i in range(0, len(ids), chunk_size):
+                chunk = ids[i:i + chunk_size]
+                cursor.execute(
+                    f"SELECT * FROM session_configs WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                )
+                created.extend(self._iter_row_dicts(cursor, cursor))
+
+            # Keep the input order
+            position = {session_id: index for index, session_id in enumerate(ids)}
+            created.sort(key=lambda session: position[session['id']])
+            return created
+
     def get_by_id(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get session by ID"""
         with self.db.get_connection() as conn:
@@ -184,6 +318,14 @@ class SessionRepository:
     def get_all(self, group_name: Optional[str] = None,
                 connection_type: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get all sessions with optional filtering"""
+        return list(self.iter_all(group_name, connection_type))
+
+    def iter_all(self, group_name: Optional[str] = None,
+                 connection_type: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over all sessions with optional filtering
+        Rows are read from the cursor as they are consumed (same thread only)
+        """
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
 
@@ -205,34 +347,34 @@ class SessionRepository:
             query += " ORDER BY last_used DESC, created_at DESC"
 
             cursor.execute(query, params)
-            rows = cursor.fetchall()
-
-            return [self._row_to_dict(row) for row in rows]
+            yield from self._iter_row_dicts(cursor, cursor)
 
     def update(self, session_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update session"""
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
 
-            # Build dynamic update query
-            set_clauses = []
-            params = []
+            unknown = update_data.keys() - self._ALLOWED_UPDATE_COLS
+            if unknown:
+                raise ValueError(f"Unknown session fields: {', '.join(sorted(unknown))}")
 
-            for key, value in update_data.items():
-                if key == 'metadata' and value is not None:
-                    value = json.dumps(value)
-                set_clauses.append(f"{key} = ?")
-                params.append(value)
-
-            if not set_clauses:
+            if not update_data:
                 return self.get_by_id(session_id)
 
+            # 固定列顺序，保证相同列集合生成完全相同的 SQL，命中语句缓存
+            columns = tuple(sorted(update_data))
+            query = self._update_sql(columns)
+
+            params = [update_data[key] for key in columns]
             params.append(session_id)
 
-            cursor.execute(
-                f"UPDATE session_configs SET {', '.join(set_clauses)} WHERE id = ?",
-                params
-            )
+            if SUPPORTS_RETURNING:
+                cursor.execute(query, params)
+                row = cursor.fetchone()
+                conn.commit()
+                return self._row_to_dict(row) if row else None
+
+            cursor.execute(query, params)
 
             conn.commit()
 
@@ -240,6 +382,17 @@ class SessionRepository:
                 return self.get_by_id(session_id)
             return None
 
+    def _update_sql(self, columns: tuple) -> str:
+        """Return the cached UPDATE statement for a sorted column tuple"""
+        query = self._update_sql_cache.get(columns)
+        if query is None:
+            set_clause = ', '.join(f"{column} = ?" for column in columns)
+            query = f"UPDATE session_configs SET {set_clause} WHERE id = ?"
+            if SUPPORTS_RETURNING:
+                query += " RETURNING *"
+            self._update_sql_cache[columns] = query
+        return query
+
     def delete(self, session_id: str) -> bool:
         """Delete session"""
         with self.db.get_connection() as conn:
@@ -253,8 +406,8 @@ class SessionRepository:
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(
-                "UPDATE session_configs SET last_used = ? WHERE id = ?",
-                (datetime.utcnow().isoformat(), session_id)
+                f"UPDATE session_configs SET last_used = {SQL_NOW_ISO} WHERE id = ?",
+                (session_id,)
             )
             conn.commit()
             return cursor.rowcount > 0
@@ -278,8 +431,8 @@ class SessionRepository:
         # Parse metadata JSON
         if result.get('metadata'):
             try:
-                result['metadata'] = json.loads(result['metadata'])
-            except json.JSONDecodeError:
+                result['metadata'] = _json_loads(result['metadata'])
+            except ValueError:
                 result['metadata'] = {}
         else:
             result['metadata'] = {}
@@ -290,19 +443,77 @@ class SessionRepository:
 
         return result
 
+    def _iter_row_dicts(self, cursor: sqlite3.Cursor, rows: Iterable[sqlite3.Row]) -> Iterator[Dict[str, Any]]:
+        """Convert many rows of one query to dictionaries (same rules as _row_to_dict)"""
+        # 列名只读取一次，循环内避免每行调用 Row.keys()
+        columns = tuple(column[0] for column in cursor.description)
+        loads = _json_loads
+
+        for row in rows:
+            result = dict(zip(columns, row))
+
+            metadata = result.get('metadata')
+            if metadata:
+                try:
+                    result['metadata'] = loads(metadata)
+                except ValueError:
+                    result['metadata'] = {}
+            else:
+                result['metadata'] = {}
+
+            if result.get('encoding') is None:
+                result['encoding'] = 'utf-8'
+
+            yield result
+
+
+class AsyncSessionRepository:
+    """
+    Async facade over SessionRepository
+    每个调用在工作线程中执行（线程各自复用一个 SQLite 连接），不阻塞事件循环
+    """
+
+    def __init__(self, repository: SessionRepository):
+        self._repository = repository
+
+    async def create(self, session_data: Dict[str, Any]) -> Dict[str, Any]:
+        return await asyncio.to_thread(self._repository.create, session_data)
+
+    async def create_many(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._repository.create_many, rows)
+
+    async def get_by_id(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._repository.get_by_id, session_id)
+
+    async def get_all(self, group_name: Optional[str] = None,
+                      connection_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._repository.get_all, group_name, connection_type)
+
+    async def update(self, session_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._repository.update, session_id, update_data)
+
+    async def delete(self, session_id: str) -> bool:
+        return await asyncio.to_thread(self._repository.delete, session_id)
+
+    async def update_last_used(self, session_id: str) -> bool:
+        return await asyncio.to_thread(self._repository.update_last_used, session_id)
+
+    async def get_groups(self) -> List[str]:
+        return await asyncio.to_thread(self._repository.get_groups)
+
 
 # Global instances
 db_manager = DatabaseManager()
-session_repository = SessionRepository()
+session_repository = SessionRepository(db_manager)
+async_session_repository = AsyncSessionRepository(session_repository)
 
 
 # Async wrapper functions for FastAPI compatibility
 async def init_db():
     """Initialize database (async wrapper)"""
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, db_manager.init_database)
+    await asyncio.to_thread(db_manager.init_database)
 
 
 def get_db():
-    """Dependency function that returns the session repository"""
-    return session_repository
\ No newline at end of file
+    """Dependency function that returns the async session repository"""
+    return async_session_repository
@@ -0,0 +1,21 @@
+"""
+Event loop selection for the uvicorn server
+"""
+
+from .config import settings
+
+
+def get_loop_impl() -> str:
+    """
+    Return the uvicorn loop implementation name
+    Uses uvloop when enabled and installed, otherwise the default asyncio loop
+    """
+    if not settings.USE_UVLOOP:
+        return "asyncio"
+
+    try:
+        import uvloop  # noqa: F401
+    except ImportError:
+        return "asyncio"
+
+    return "uvloop"
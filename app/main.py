@@ -4,14 +4,22 @@ FastAPI-based web terminal with SSH and Telnet support
 """
 
 from fastapi import FastAPI, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.exception_handlers import http_exception_handler, request_validation_exception_handler
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.exceptions import HTTPException as StarletteHTTPException
 import uvicorn
+import asyncio
+import sys
 
 from .core.config import settings
 from .api import api_router
+from .api.responses import DefaultResponse, NO_CACHE_HEADERS
 from .core.database import init_db
+from .core.loop import get_loop_impl
+from .protocols.ssh_pool import ssh_connection_pool
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -20,6 +28,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/api/docs" if settings.DEBUG else None,
     redoc_url="/api/redoc" if settings.DEBUG else None,
+    default_response_class=DefaultResponse,
 )
 
 # CORS middleware
@@ -31,19 +40,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# API 缓存控制中间件 - 防止浏览器缓存导致 API 延迟
-@app.middleware("http")
-async def add_cache_control(request: Request, call_next):
-    """为 API 路径添加缓存控制头"""
-    response = await call_next(request)
-    
-    # 为 /api/ 路径添加缓存控制头，防止浏览器缓存导致延迟
-    if request.url.path.startswith("/api/"):
-        response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-        response.headers["Pragma"] = "no-cache"
-    
-    return response
-
 # Mount static files
 app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
 
@@ -51,11 +47,43 @@ app.mount("/static", StaticFiles(directory="frontend/static"), name="static")
 app.include_router(api_router, prefix="/api")
 
 
+# 错误响应由异常处理器生成，不经过 NoCacheResponse，这里为 API 路径补上缓存控制头
+@app.exception_handler(StarletteHTTPException)
+async def api_http_exception_handler(request: Request, exc: StarletteHTTPException):
+    """Default HTTPException handling, plus no-cache headers for API paths"""
+    response = await http_exception_handler(request, exc)
+    if request.url.path.startswith("/api/"):
+        response.headers.update(NO_CACHE_HEADERS)
+    return response
+
+
+@app.exception_handler(RequestValidationError)
+async def api_validation_exception_handler(request: Request, exc: RequestValidationError):
+    """Default validation error handling, plus no-cache headers for API paths"""
+    response = await request_validation_exception_handler(request, exc)
+    if request.url.path.startswith("/api/"):
+        response.headers.update(NO_CACHE_HEADERS)
+    return response
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize application on startup"""
+    loop = asyncio.get_running_loop()
+
+    # Python 3.12+: 使用 eager task factory，任务创建后立即执行直到首次挂起
+    if sys.version_info >= (3, 12):
+        loop.set_task_factory(asyncio.eager_task_factory)
+
     await init_db()
-    print(f"webXTerm started on {settings.HOST}:{settings.PORT}")
+    # 显示实际使用的事件循环（uvloop 时本地终端 PTY 的 add_reader 也由 libuv 处理）
+    print(f"webXTerm started on {settings.HOST}:{settings.PORT} (event loop: {type(loop).__module__})")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close pooled SSH connections on shutdown"""
+    await ssh_connection_pool.close_all()
 
 
 @app.get("/")
@@ -75,5 +103,6 @@ if __name__ == "__main__":
         host=settings.HOST,
         port=settings.PORT,
         reload=settings.DEBUG,
+        loop=get_loop_impl(),
         log_level="info" if not settings.DEBUG else "debug",
     )
@@ -2,7 +2,7 @@
 Session configuration models (Pydantic only, no SQLAlchemy)
 """
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, Dict
 from datetime import datetime
 import enum
@@ -33,7 +33,7 @@ class SessionConfigBase(BaseModel):
     encoding: str = "auto"  # 服务器编码（自动检测）
     device: Optional[str] = "ttyUSB0"  # Serial device name
     baud_rate: Optional[int] = 115200   # Serial baud rate
-    metadata: Optional[Dict[str, str]] = {}
+    metadata: Optional[Dict[str, str]] = Field(default_factory=dict)
 
 
 class SessionConfigCreate(SessionConfigBase):
@@ -74,7 +74,7 @@ class SessionConfigResponse(BaseModel):
     baud_rate: Optional[int] = None
     created_at: str  # ISO format datetime string
     last_used: Optional[str] = None  # ISO format datetime string
-    metadata: Dict[str, str] = {}
+    metadata: Dict[str, str] = Field(default_factory=dict)
 
     # Exclude sensitive data from response
     password: Optional[str] = None
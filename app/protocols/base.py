@@ -7,8 +7,28 @@ from typing import AsyncGenerator, Optional
 import asyncio
 import logging
 
+from ..core.config import settings
+
 logger = logging.getLogger(__name__)
 
+# 单个WebSocket帧合并输出的最大长度
+OUTPUT_BATCH_MAX_SIZE = 64 * 1024
+
+
+def coalesce_chunks(chunks: list) -> list:
+    """Join consecutive chunks of the same type (bytes and text are never mixed)"""
+    frames = []
+    for chunk in chunks:
+        if frames and type(frames[-1][0]) is type(chunk):
+            frames[-1].append(chunk)
+        else:
+            frames.append([chunk])
+    return [
+        group[0] if len(group) == 1
+        else b''.join(group) if isinstance(group[0], bytes) else ''.join(group)
+        for group in frames
+    ]
+
 
 class ConnectionProtocol(ABC):
     """
@@ -21,7 +41,39 @@ class ConnectionProtocol(ABC):
         self.encoding = getattr(config, 'encoding', 'utf-8')
         self.connected = False
         self.closed = False
-        self._output_queue = asyncio.Queue()
+        # 输出缓冲区：短时间内的多块输出合并后一次交给读取端
+        self._output_chunks = []
+        self._output_size = 0
+        self._output_ready = asyncio.Event()
+        self._output_space = asyncio.Event()  # 缓冲区未满时置位，生产端在满时等待
+        self._output_space.set()
+        self._output_flush_handle = None
+        self._output_ended = False
+        self._output_dropped = 0  # OUTPUT_DROP_OLDEST 模式下累计丢弃的字符/字节数
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @closed.setter
+    def closed(self, value: bool):
+        was_closed = getattr(self, '_closed', False)
+        self._closed = value
+        if value and not was_closed:
+            self._signal_output_end()
+
+    def _signal_output_end(self):
+        """Wake read_output so it finishes once buffered output is consumed"""
+        self._output_ended = True
+        self._wake_output_reader()
+        # Release producers waiting for buffer space
+        self._output_space.set()
+
+    def _wake_output_reader(self):
+        if self._output_flush_handle is not None:
+            self._output_flush_handle.cancel()
+            self._output_flush_handle = None
+        self._output_ready.set()
 
     @abstractmethod
     async def connect(self) -> bool:
@@ -68,26 +120,96 @@ class ConnectionProtocol(ABC):
     async def read_output(self) -> AsyncGenerator[str, None]:
         """
         Generator that yields output from the connection
+        Consecutive chunks of the same type are joined into one item of at most OUTPUT_BATCH_MAX_SIZE
         """
-        while not self.closed:
-            try:
-                # Wait for data with timeout
-                data = await asyncio.wait_for(
-                    self._output_queue.get(),
-                    timeout=1.0
-                )
+        # 无超时等待：空闲连接不会周期性唤醒，关闭时由 _signal_output_end 唤醒并退出
+        while True:
+            if not self._output_chunks:
+                if self._output_ended:
+                    break
+                await self._output_ready.wait()
+            # 合并缓冲区中已就绪的输出，减少WebSocket帧和TCP分段数量
+            for data in coalesce_chunks(self._take_output(OUTPUT_BATCH_MAX_SIZE)):
                 yield data
-            except asyncio.TimeoutError:
-                # Continue waiting for data
-                continue
-            except Exception as e:
-                logger.error(f"Error reading output: {str(e)}")
-                break
+
+    def _take_output(self, max_size: Optional[int] = None) -> list:
+        """Remove and return buffered chunks (all of them, or at most max_size worth)"""
+        chunks = self._output_chunks
+        if max_size is not None and self._output_size > max_size:
+            taken = 0
+            count = 0
+            while count < len(chunks) and taken + len(chunks[count]) <= max_size:
+                taken += len(chunks[count])
+                count += 1
+            if count:
+                chunks, self._output_chunks = chunks[:count], chunks[count:]
+            else:
+                # 单块超过上限时拆分，剩余部分留在缓冲区下次取出
+                head = chunks[0]
+                chunks, self._output_chunks = [head[:max_size]], [head[max_size:]] + chunks[1:]
+                taken = max_size
+            self._output_size -= taken
+        else:
+            self._output_chunks = []
+            self._output_size = 0
+
+        if not self._output_chunks:
+            if self._output_flush_handle is not None:
+                self._output_flush_handle.cancel()
+                self._output_flush_handle = None
+            if not self._output_ended:
+                self._output_ready.clear()
+        limit = settings.OUTPUT_BUFFER_MAX_SIZE
+        if not limit or self._output_size < limit:
+            self._output_space.set()
+        return chunks
+
+    def _drop_oldest_output(self, incoming: int, limit: int) -> None:
+        """Discard the oldest buffered chunks so incoming output fits under limit"""
+        chunks = self._output_chunks
+        dropped = 0
+        count = 0
+        while count < len(chunks) and self._output_size - dropped + incoming > limit:
+            dropped += len(chunks[count])
+            count += 1
+        if not count:
+            return
+
+        del chunks[:count]
+        self._output_size -= dropped
+        self._output_dropped += dropped
+        # 只在第一次丢弃时告警，之后按调试级别记录累计数量
+        log = logger.warning if self._output_dropped == dropped else logger.debug
+        log("输出缓冲区已满，丢弃最早的 %d 字符/字节（累计 %d）", dropped, self._output_dropped)
 
     async def _queue_output(self, data: str):
-        """Queue output data for sending to WebSocket"""
-        if not self.closed:
-            await self._output_queue.put(data)
+        """Buffer output data for sending to WebSocket"""
+        if self.closed or not data:
+            return
+
+        limit = settings.OUTPUT_BUFFER_MAX_SIZE
+        if limit and settings.OUTPUT_DROP_OLDEST:
+            # 丢弃最早的输出腾出空间，读取端从不等待
+            if self._output_size + len(data) > limit:
+                self._drop_oldest_output(len(data), limit)
+        else:
+            # 缓冲区已满时等待读取端取走数据（背压传递到 SSH/Telnet 读取端）
+            while limit and self._output_size >= limit and not self.closed:
+                self._output_space.clear()
+                await self._output_space.wait()
+            if self.closed:
+                return
+
+        self._output_chunks.append(data)
+        self._output_size += len(data)
+
+        if limit and self._output_size >= limit:
+            self._wake_output_reader()
+        elif self._output_flush_handle is None and not self._output_ready.is_set():
+            # 延迟片刻再唤醒读取端，让突发输出合并成一块
+            self._output_flush_handle = asyncio.get_running_loop().call_later(
+                settings.OUTPUT_FLUSH_DELAY, self._wake_output_reader
+            )
 
     def get_connection_info(self) -> dict:
         """Get connection information"""
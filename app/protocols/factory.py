@@ -2,13 +2,26 @@
 Connection Factory for creating protocol instances
 """
 
-import os
-
 from ..models.session import ConnectionType
 from .ssh import SSHProtocol
 from .telnet import TelnetProtocol
 from .serial import SerialProtocol
-from .local import LocalProtocol
+from .local import LocalProtocol, LOGIN_PATH, LOGIN_AVAILABLE
+
+# Connection type -> protocol class
+_PROTOCOLS = {
+    ConnectionType.SSH: SSHProtocol,
+    ConnectionType.TELNET: TelnetProtocol,
+    ConnectionType.USBSERIAL: SerialProtocol,
+    ConnectionType.LOCAL: LocalProtocol
+}
+
+_DEFAULT_PORTS = {
+    ConnectionType.SSH: 22,
+    ConnectionType.TELNET: 23,
+    ConnectionType.USBSERIAL: 0,
+    ConnectionType.LOCAL: 0
+}
 
 
 class ConnectionFactory:
@@ -30,20 +43,13 @@ class ConnectionFactory:
             ValueError: If connection type is unsupported or connection fails
         """
 
-        if connection_type == ConnectionType.SSH:
-            protocol = SSHProtocol(config)
-        elif connection_type == ConnectionType.TELNET:
-            protocol = TelnetProtocol(config)
-        elif connection_type == ConnectionType.USBSERIAL:
-            protocol = SerialProtocol(config)
-        elif connection_type == ConnectionType.LOCAL:
-            # 检查 /usr/bin/login 是否存在
-            login_path = '/usr/bin/login'
-            if not os.path.exists(login_path):
-                raise ValueError(f"Local terminal login is disabled: {login_path} not found")
-            protocol = LocalProtocol(config)
-        else:
+        protocol_class = _PROTOCOLS.get(connection_type)
+        if protocol_class is None:
             raise ValueError(f"Unsupported connection type: {connection_type}")
+        if protocol_class is LocalProtocol and not LOGIN_AVAILABLE:
+            raise ValueError(f"Local terminal login is disabled: {LOGIN_PATH} not found")
+
+        protocol = protocol_class(config)
 
         # Establish connection
         success = await protocol.connect()
@@ -55,20 +61,14 @@ class ConnectionFactory:
     @staticmethod
     def get_supported_types():
         """Get list of supported connection types"""
-        return [ConnectionType.SSH, ConnectionType.TELNET, ConnectionType.USBSERIAL, ConnectionType.LOCAL]
+        return list(_PROTOCOLS)
 
     @staticmethod
     def get_default_port(connection_type: ConnectionType) -> int:
         """Get default port for connection type"""
-        defaults = {
-            ConnectionType.SSH: 22,
-            ConnectionType.TELNET: 23,
-            ConnectionType.USBSERIAL: 0,
-            ConnectionType.LOCAL: 0
-        }
-        return defaults.get(connection_type, 22)
+        return _DEFAULT_PORTS.get(connection_type, 22)
 
     @staticmethod
     def is_local_login_available() -> bool:
         """Check if local login is available (requires /usr/bin/login)"""
-        return os.path.exists('/usr/bin/login')
\ No newline at end of file
+        return LOGIN_AVAILABLE
\ No newline at end of file
@@ -4,9 +4,15 @@ Uses /usr/bin/login for local user authentication
 """
 
 import asyncio
+import codecs
+import errno
+import functools
 import logging
 import os
 import pty
+import re
+import select
+import signal
 import struct
 import termios
 import fcntl
@@ -16,6 +22,32 @@ from .base import ConnectionProtocol
 
 logger = logging.getLogger(__name__)
 
+# 本地用户认证程序；是否可执行在导入时检查一次
+LOGIN_PATH = '/usr/bin/login'
+LOGIN_AVAILABLE = os.access(LOGIN_PATH, os.X_OK)
+
+# login 子进程的环境变量，导入时构建一次
+_CHILD_ENV = {
+    **os.environ,
+    'TERM': 'xterm-256color',
+    'HOME': os.path.expanduser('~'),
+    'SHELL': os.environ.get('SHELL', '/bin/bash'),
+}
+
+# 单次从 PTY 读空数据的缓冲区大小
+PTY_READ_SIZE = 64 * 1024
+
+# 关闭时等待子进程退出的时间（秒），超时后发送 SIGKILL
+CHILD_EXIT_TIMEOUT = 1.0
+CHILD_EXIT_POLL_INTERVAL = 0.05  # 不支持 pidfd 时的轮询间隔
+
+# 自动登录时检测的提示（不区分大小写）
+LOGIN_PROMPT_RE = re.compile(r'login:|username:|user:', re.IGNORECASE)
+PASSWORD_PROMPT_RE = re.compile(r'password:|passwd:', re.IGNORECASE)
+
+# 检测提示只需保留输出末尾的少量字符
+AUTO_LOGIN_TAIL_SIZE = 64
+
 
 class LocalProtocol(ConnectionProtocol):
     """
@@ -29,7 +61,12 @@ class LocalProtocol(ConnectionProtocol):
         self.slave_fd = None
         self.pid = None
         self.reader_task = None
+        # 边沿触发监听 PTY（仅 Linux）：私有 epoll 以 EPOLLET 注册 master_fd，事件循环只监听 epoll fd
+        self._pty_epoll = None
+        self._pty_edge = None
         self.encoding = 'utf-8'
+        # 增量解码：跨两次读取被截断的多字节字符不会变成乱码
+        self._decoder = codecs.getincrementaldecoder(self.encoding)(errors='replace')
 
         # 终端尺寸
         self.cols = getattr(config, 'cols', 80)
@@ -39,6 +76,9 @@ class LocalProtocol(ConnectionProtocol):
         self.auto_login_username = getattr(config, 'username', '')
         self.auto_login_password = getattr(config, 'password', '')
         self.auto_login_state = 'waiting_login' if self.auto_login_username else 'done'
+        # 预先编码好的自动输入内容
+        self._username_bytes = ((self.auto_login_username or '') + '\n').encode(self.encoding)
+        self._password_bytes = ((self.auto_login_password or '') + '\n').encode(self.encoding)
         self.output_buffer = ''  # 用于检测登录提示
 
     async def connect(self) -> bool:
@@ -58,30 +98,66 @@ class LocalProtocol(ConnectionProtocol):
             flags = fcntl.fcntl(self.master_fd, fcntl.F_GETFL)
             fcntl.fcntl(self.master_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
 
-            # Fork 进程
-            self.pid = os.fork()
+            # 启动 login 子进程
+            self.pid = self._start_child()
 
-            if self.pid == 0:
-                # 子进程
-                self._setup_child_process()
-            else:
-                # 父进程
-                os.close(self.slave_fd)
-                self.slave_fd = None
+            # 父进程
+            os.close(self.slave_fd)
+            self.slave_fd = None
 
-                self.connected = True
+            self.connected = True
 
-                # 启动读取任务
-                self.reader_task = asyncio.create_task(self._read_from_pty())
+            # 启动读取任务
+            self.reader_task = asyncio.create_task(self._read_from_pty())
 
-                logger.info(f"本地终端会话已启动，PID: {self.pid}")
-                return True
+            logger.info(f"本地终端会话已启动，PID: {self.pid}")
+            return True
 
         except Exception as e:
             logger.error(f"启动本地终端失败: {str(e)}")
             await self.close()
             raise
 
+    def _start_child(self) -> int:
+        """
+        启动 login 子进程，返回 PID
+        优先使用 posix_spawn（fork 与 exec 之间不运行 Python 代码），不支持时回退到 fork
+        """
+        if hasattr(os, 'posix_spawn'):
+            try:
+                return self._spawn_login()
+            except NotImplementedError:
+                # 平台不支持 setsid 参数
+                pass
+
+        pid = os.fork()
+        if pid == 0:
+            # 子进程（不会返回）
+            self._setup_child_process()
+        return pid
+
+    def _spawn_login(self) -> int:
+        """
+        使用 posix_spawn 启动 login
+        """
+        # 注意：/usr/bin/login 在某些系统上可能需要 root 权限
+        # 如果 login 不可用，则报错而不是降级到 shell
+        if not LOGIN_AVAILABLE:
+            raise ValueError(f"本地终端登录被禁用: {LOGIN_PATH} 不存在或不可执行")
+
+        slave_path = os.ttyname(self.slave_fd)
+        file_actions = [
+            # setsid 之后按路径打开 slave，使其成为新会话的控制终端
+            (os.POSIX_SPAWN_OPEN, 0, slave_path, os.O_RDWR, 0),
+            (os.POSIX_SPAWN_DUP2, 0, 1),  # stdout
+            (os.POSIX_SPAWN_DUP2, 0, 2),  # stderr
+        ]
+        # master_fd/slave_fd 不可继承（O_CLOEXEC），exec 时自动关闭
+        return os.posix_spawn(
+            LOGIN_PATH, [LOGIN_PATH], _CHILD_ENV,
+            file_actions=file_actions, setsid=True
+        )
+
     def _setup_child_process(self):
         """
         设置子进程环境
@@ -105,73 +181,152 @@ class LocalProtocol(ConnectionProtocol):
             if self.slave_fd > 2:
                 os.close(self.slave_fd)
 
-            # 设置环境变量
-            env = os.environ.copy()
-            env['TERM'] = 'xterm-256color'
-            env['HOME'] = os.path.expanduser('~')
-            env['SHELL'] = os.environ.get('SHELL', '/bin/bash')
-
             # 执行 login 程序
             # 注意：/usr/bin/login 在某些系统上可能需要 root 权限
             # 如果 login 不可用，则报错退出而不是降级到 shell
-            login_path = '/usr/bin/login'
-
-            if os.path.exists(login_path) and os.access(login_path, os.X_OK):
+            if LOGIN_AVAILABLE:
                 # 使用 login 进行本地用户认证
-                os.execve(login_path, [login_path], env)
+                os.execve(LOGIN_PATH, [LOGIN_PATH], _CHILD_ENV)
             else:
                 # login 不可用，报错退出
-                logger.error(f"本地终端登录被禁用: {login_path} 不存在或不可执行")
+                logger.error(f"本地终端登录被禁用: {LOGIN_PATH} 不存在或不可执行")
                 os._exit(1)
 
         except Exception as e:
             logger.error(f"子进程设置失败: {str(e)}")
             os._exit(1)
 
+    def _drain_pty(self, read_view: memoryview):
+        """
+        读取 PTY 中当前可用的全部数据到缓冲区，直到无数据或缓冲区写满
+        Returns (bytes filled, OSError or None); a zero-length read is reported as EIO
+        """
+        filled = 0
+        size = len(read_view)
+        try:
+            while filled < size:
+                n = os.readv(self.master_fd, [read_view[filled:]])
+                if not n:
+                    return filled, OSError(errno.EIO, "PTY EOF")
+                filled += n
+        except BlockingIOError:
+            pass
+        except OSError as e:
+            return filled, e
+        return filled, None
+
     async def _read_from_pty(self):
         """
         从 PTY 读取数据并发送到 WebSocket
         """
         logger.debug("开始从 PTY 读取数据")
+        read_buffer = bytearray(PTY_READ_SIZE)
+        read_view = memoryview(read_buffer)
+        edge_triggered = self._start_edge_watch()
 
         while not self.closed and self.connected:
             try:
-                # 使用 asyncio 的方式异步读取
-                await asyncio.sleep(0.01)  # 小延迟避免 CPU 占用过高
-
-                try:
-                    data = os.read(self.master_fd, 4096)
-                    if data:
-                        # 解码数据
-                        try:
-                            text = data.decode(self.encoding, errors='replace')
-                        except UnicodeDecodeError:
-                            text = data.decode('utf-8', errors='replace')
-
-                        # 处理自动登录
-                        await self._handle_auto_login(text)
+                # 一次读空 PTY（读入预分配缓冲区），合并为一块输出，减少系统调用和下游帧数
+                filled, error = self._drain_pty(read_view)
+                if filled:
+                    text = self._decoder.decode(read_view[:filled])
+                    if text:
+                        # 处理自动登录（登录完成后不再进入）
+                        if self.auto_login_state != 'done':
+                            await self._handle_auto_login(text)
 
                         # 队列输出
                         await self._queue_output(text)
 
-                except BlockingIOError:
-                    # 非阻塞模式下没有数据
-                    continue
-                except OSError as e:
-                    if e.errno == 5:  # EIO - 终端已关闭
+                if error is not None:
+                    if error.errno == errno.EIO:  # EIO - 终端已关闭
                         logger.info("PTY 已关闭")
-                        break
                     else:
-                        logger.error(f"读取 PTY 错误: {e}")
-                        break
+                        logger.error(f"读取 PTY 错误: {error}")
+                    break
+
+                if not filled:
+                    # 暂无数据：等待事件循环通知 PTY 可读，而不是定时轮询
+                    if edge_triggered:
+                        # 先清除再读空：清除之后到达的数据会产生新的边沿
+                        await self._pty_edge.wait()
+                        self._pty_edge.clear()
+                    else:
+                        await self._wait_pty_readable()
 
             except Exception as e:
                 logger.error(f"读取 PTY 数据异常: {str(e)}")
                 break
 
         logger.debug("PTY 读取循环结束")
+        # 输出末尾不完整的字符
+        tail = self._decoder.decode(b'', final=True)
+        if tail:
+            await self._queue_output(tail)
         await self.close()
 
+    def _start_edge_watch(self) -> bool:
+        """
+        以边沿触发方式监听 master_fd
+        每次有新数据只唤醒一次（背压等待期间也不会反复触发），且无需每次等待都注册/注销
+        Returns False when epoll is unavailable (non-Linux), callers fall back to _wait_pty_readable
+        """
+        if not hasattr(select, 'epoll'):
+            return False
+
+        loop = asyncio.get_running_loop()
+        epoll = select.epoll()
+        edge = asyncio.Event()
+
+        def on_edge():
+            # 取走就绪事件，epoll fd 随之变为不可读
+            try:
+                epoll.poll(0)
+            except OSError:
+                pass
+            edge.set()
+
+        try:
+            epoll.register(self.master_fd, select.EPOLLIN | select.EPOLLET)
+            loop.add_reader(epoll.fileno(), on_edge)
+        except (OSError, ValueError, NotImplementedError) as e:
+            logger.debug(f"无法使用边沿触发监听 PTY: {e}")
+            epoll.close()
+            return False
+
+        self._pty_epoll = epoll
+        self._pty_edge = edge
+        return True
+
+    def _stop_edge_watch(self):
+        """注销并关闭 PTY 的私有 epoll"""
+        epoll, self._pty_epoll = self._pty_epoll, None
+        if epoll is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_reader(epoll.fileno())
+        except (RuntimeError, ValueError):
+            pass
+        epoll.close()
+
+    async def _wait_pty_readable(self):
+        """
+        等待 master_fd 可读（由事件循环的 selector 通知）
+        """
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+
+        def on_readable():
+            if not waiter.done():
+                waiter.set_result(None)
+
+        loop.add_reader(self.master_fd, on_readable)
+        try:
+            await waiter
+        finally:
+            # 读取期间不保留注册，避免背压等待时 selector 反复触发
+            loop.remove_reader(self.master_fd)
+
     async def send_data(self, data: str) -> None:
         """
         发送数据到本地终端
@@ -215,14 +370,18 @@ class LocalProtocol(ConnectionProtocol):
         except Exception as e:
             logger.error(f"调整终端尺寸失败: {str(e)}")
 
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _winsize(rows: int, cols: int) -> bytes:
+        """打包 TIOCSWINSZ 结构: rows, cols, xpixel, ypixel"""
+        return struct.pack('HHHH', rows, cols, 0, 0)
+
     def _set_terminal_size(self, fd: int, rows: int, cols: int):
         """
         设置终端窗口尺寸
         """
         try:
-            # TIOCSWINSZ 结构: rows, cols, xpixel, ypixel
-            size = struct.pack('HHHH', rows, cols, 0, 0)
-            fcntl.ioctl(fd, termios.TIOCSWINSZ, size)
+            fcntl.ioctl(fd, termios.TIOCSWINSZ, self._winsize(rows, cols))
         except Exception as e:
             logger.error(f"设置终端尺寸失败: {str(e)}")
 
@@ -234,33 +393,26 @@ class LocalProtocol(ConnectionProtocol):
         if self.auto_login_state == 'done':
             return
 
-        # 将文本添加到缓冲区
-        self.output_buffer += text
-        # 只保留最后 500 个字符，避免缓冲区过大
-        if len(self.output_buffer) > 500:
-            self.output_buffer = self.output_buffer[-500:]
-
-        # 转换为小写以便不区分大小写匹配
-        buffer_lower = self.output_buffer.lower()
+        # 只保留输出末尾的少量字符，提示都很短
+        tail = AUTO_LOGIN_TAIL_SIZE
+        self.output_buffer = (self.output_buffer + text[-tail:])[-tail:]
 
         try:
             if self.auto_login_state == 'waiting_login':
                 # 检测登录提示：login:、username:、user: 等
-                if any(prompt in buffer_lower for prompt in ['login:', 'username:', 'user:']):
+                if LOGIN_PROMPT_RE.search(self.output_buffer):
                     logger.info(f"检测到登录提示，自动输入用户名: {self.auto_login_username}")
-                    # 输入用户名并回车
-                    await asyncio.sleep(0.1)  # 小延迟确保提示完整显示
-                    os.write(self.master_fd, (self.auto_login_username + '\n').encode(self.encoding))
+                    # 输入用户名并回车（看到提示时 login 已在等待输入）
+                    os.write(self.master_fd, self._username_bytes)
                     self.auto_login_state = 'waiting_password'
                     self.output_buffer = ''  # 清空缓冲区
 
             elif self.auto_login_state == 'waiting_password':
                 # 检测密码提示：password:、passwd: 等
-                if 'password:' in buffer_lower or 'passwd:' in buffer_lower:
+                if PASSWORD_PROMPT_RE.search(self.output_buffer):
                     logger.info("检测到密码提示，自动输入密码")
                     # 输入密码并回车
-                    await asyncio.sleep(0.1)
-                    os.write(self.master_fd, (self.auto_login_password + '\n').encode(self.encoding))
+                    os.write(self.master_fd, self._password_bytes)
                     self.auto_login_state = 'done'
                     self.output_buffer = ''  # 清空缓冲区
                     logger.info("自动登录完成")
@@ -280,8 +432,9 @@ class LocalProtocol(ConnectionProtocol):
         self.closed = True
         self.connected = False
 
-        # 取消读取任务
-        if self.reader_task and not self.reader_task.done():
+        # 取消读取任务（读取任务自身调用 close 时不能等待自己）
+        if (self.reader_task and not self.reader_task.done()
+                and self.reader_task is not asyncio.current_task()):
             self.reader_task.cancel()
             try:
                 await self.reader_task
@@ -289,6 +442,7 @@ class LocalProtocol(ConnectionProtocol):
                 pass
 
         # 关闭文件描述符
+        self._stop_edge_watch()
         if self.master_fd is not None:
             try:
                 os.close(self.master_fd)
@@ -303,24 +457,76 @@ class LocalProtocol(ConnectionProtocol):
                 pass
             self.slave_fd = None
 
-        # 终止子进程
+        # 终止子进程：先 SIGTERM，超时后 SIGKILL，并回收进程避免僵尸
         if self.pid is not None:
+            pid, self.pid = self.pid, None
             try:
-                os.kill(self.pid, 15)  # SIGTERM
-                # 等待子进程结束
                 try:
-                    os.waitpid(self.pid, os.WNOHANG)
-                except ChildProcessError:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    # 进程已退出，仍需回收
                     pass
+                if not await self._wait_child_exit(pid, CHILD_EXIT_TIMEOUT):
+                    logger.warning(f"子进程 {pid} 未响应 SIGTERM，发送 SIGKILL")
+                    os.kill(pid, signal.SIGKILL)
+                    await self._wait_child_exit(pid, CHILD_EXIT_TIMEOUT)
             except ProcessLookupError:
-                # 进程已不存在
                 pass
             except Exception as e:
                 logger.error(f"终止子进程失败: {str(e)}")
-            self.pid = None
 
         logger.info("本地终端会话已关闭")
 
+    async def _wait_child_exit(self, pid: int, timeout: float) -> bool:
+        """
+        等待子进程退出并回收
+        Returns True once the child is reaped, False on timeout
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        # Linux 5.3+: pidfd 在进程退出时可读，可交给事件循环等待
+        pidfd = None
+        if hasattr(os, 'pidfd_open'):
+            try:
+                pidfd = os.pidfd_open(pid)
+            except OSError:
+                pidfd = None
+
+        try:
+            while True:
+                try:
+                    reaped_pid, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    return True
+                if reaped_pid:
+                    return True
+
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return False
+
+                if pidfd is None:
+                    await asyncio.sleep(min(CHILD_EXIT_POLL_INTERVAL, remaining))
+                    continue
+
+                waiter = loop.create_future()
+
+                def on_exit():
+                    if not waiter.done():
+                        waiter.set_result(None)
+
+                loop.add_reader(pidfd, on_exit)
+                try:
+                    await asyncio.wait_for(waiter, remaining)
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    loop.remove_reader(pidfd)
+        finally:
+            if pidfd is not None:
+                os.close(pidfd)
+
     def get_connection_info(self) -> dict:
         """获取连接信息"""
         return {
@@ -3,14 +3,19 @@ USB-Serial Connection Protocol Implementation
 """
 
 import asyncio
+import codecs
 import logging
 import threading
 from typing import Optional
 
 from .base import ConnectionProtocol
+from ..core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# 单次从串口读取的最大字节数
+SERIAL_READ_SIZE = 64 * 1024
+
 
 class SerialProtocol(ConnectionProtocol):
     """
@@ -29,12 +34,24 @@ class SerialProtocol(ConnectionProtocol):
         self.baud_rate = getattr(config, 'baud_rate', 115200)
         self.device_path = f'/dev/{self.device}'
 
+        # Opt-in: queue raw bytes and let the browser decode them
+        self.binary_passthrough = settings.SERIAL_BINARY_PASSTHROUGH
+
+        # 同一事件循环周期内的多次发送合并为一次写入
+        self._pending = bytearray()
+        self._flush_scheduled = False
+        # 写入失败后标记为损坏：后续发送直接忽略，由读取任务结束连接
+        self._broken = False
+
+        # 增量解码：跨两次读取被截断的多字节字符不会变成乱码
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
     async def connect(self) -> bool:
         """Establish serial connection"""
         try:
             import serial_asyncio
 
-            self._event_loop = asyncio.get_event_loop()
+            self._event_loop = asyncio.get_running_loop()
 
             logger.info(f"Opening serial port {self.device_path} at {self.baud_rate} baud")
 
@@ -74,58 +91,87 @@ class SerialProtocol(ConnectionProtocol):
     async def _read_output(self):
         """Background task to read from serial port"""
         try:
-            while self.connected and self._reader and not self.closed:
+            while self.connected and self._reader and not self.closed and not self._broken:
                 try:
-                    data = await asyncio.wait_for(
-                        self._reader.read(4096),
-                        timeout=1.0
-                    )
-                    if data:
-                        decoded = data.decode('utf-8', errors='replace')
+                    # 直接等待数据，关闭时由 close() 取消任务唤醒
+                    data = await self._reader.read(SERIAL_READ_SIZE)
+                    if not data:
+                        # Empty read means EOF (port closed)
+                        logger.info("Serial port EOF detected")
+                        break
+
+                    if self.binary_passthrough:
+                        await self._queue_output(data)
+                        continue
+
+                    decoded = self._decoder.decode(data)
+                    if decoded:
                         await self._queue_output(decoded)
-                    else:
-                        # Empty read may indicate port closed
-                        if self._reader.at_eof():
-                            logger.info("Serial port EOF detected")
-                            break
-                except asyncio.TimeoutError:
-                    continue
                 except Exception as e:
                     if not self.closed:
                         logger.error(f"Error reading serial port: {str(e)}")
                     break
+
+            # 输出末尾不完整的字符
+            tail = self._decoder.decode(b'', final=True)
+            if tail:
+                await self._queue_output(tail)
         finally:
             logger.info("Serial read task ended")
             self.closed = True
 
     async def send_data(self, data: str) -> None:
         """Send data to serial port"""
+        await self._send_bytes(data.encode('utf-8'))
+
+    async def send_raw_data(self, data: bytes) -> None:
+        """Send raw binary data to serial port"""
+        await self._send_bytes(data)
+
+    async def _send_bytes(self, data_bytes: bytes) -> None:
+        """Buffer bytes and schedule a single write for this loop iteration"""
+        if self._broken:
+            return
         if not self.connected or not self._writer:
             raise ValueError("Serial connection not established")
 
+        self._pending.extend(data_bytes)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
         try:
-            data_bytes = data.encode('utf-8')
-            self._writer.write(data_bytes)
+            # 仅在写缓冲区超过高水位时才真正等待
             await self._writer.drain()
         except Exception as e:
-            logger.error(f"Error sending data to serial port: {str(e)}")
-            self.connected = False
-            self.closed = True
-            raise ValueError(f"Serial send failed: {str(e)}")
+            self._mark_broken(e)
 
-    async def send_raw_data(self, data: bytes) -> None:
-        """Send raw binary data to serial port"""
-        if not self.connected or not self._writer:
-            raise ValueError("Serial connection not established")
+    def _flush(self):
+        """Write all buffered bytes to the serial port at once"""
+        self._flush_scheduled = False
+        if not self._pending or not self._writer:
+            return
 
+        data = bytes(self._pending)
+        self._pending.clear()
         try:
             self._writer.write(data)
-            await self._writer.drain()
         except Exception as e:
-            logger.error(f"Error sending raw data to serial port: {str(e)}")
-            self.connected = False
+            self._mark_broken(e)
+
+    def _mark_broken(self, error: Exception):
+        """Record a write failure once and let the read task end the connection"""
+        if self._broken:
+            return
+        logger.error(f"Error sending data to serial port: {str(error)}")
+        self._broken = True
+        self.connected = False
+        self._pending.clear()
+        # 读取任务结束时置 closed，输出结束后由 WebSocket 清理流程调用 close()
+        if self._read_task and not self._read_task.done():
+            self._read_task.cancel()
+        else:
             self.closed = True
-            raise ValueError(f"Serial send failed: {str(e)}")
 
     async def resize_terminal(self, cols: int, rows: int) -> None:
         """No-op for serial connections (no PTY)"""
@@ -133,7 +179,8 @@ class SerialProtocol(ConnectionProtocol):
 
     async def close(self) -> None:
         """Close serial connection"""
-        if self.closed:
+        # 读取任务结束时已置 closed，但串口可能仍未关闭
+        if self.closed and self._writer is None:
             return
 
         logger.info(f"Closing serial connection: {self.device_path}")
@@ -150,8 +197,10 @@ class SerialProtocol(ConnectionProtocol):
 
         # Close writer (which closes the serial port)
         if self._writer:
+            self._flush()
+            writer, self._writer = self._writer, None
             try:
-                self._writer.close()
+                writer.close()
             except Exception as e:
                 logger.debug(f"Error closing serial writer: {str(e)}")
 
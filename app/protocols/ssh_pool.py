@@ -0,0 +1,95 @@
+"""
+SSH connection pool
+Keeps authenticated asyncssh connections idle for reuse by later sessions
+"""
+
+import asyncio
+import hashlib
+import logging
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, int, str, str]
+
+
+def pool_key(config) -> PoolKey:
+    """
+    Build the pool key (hostname, port, username, auth fingerprint)
+    The fingerprint hashes the credentials so a pooled connection is only reused with the same ones
+    """
+    digest = hashlib.sha256()
+    for secret in (getattr(config, 'private_key', None),
+                   getattr(config, 'passphrase', None),
+                   getattr(config, 'password', None)):
+        digest.update((secret or '').encode('utf-8'))
+        digest.update(b'\0')
+    return (config.hostname, config.port, config.username, digest.hexdigest())
+
+
+class SSHConnectionPool:
+    """
+    Idle authenticated SSH connections, keyed by pool_key()
+    A connection is held by at most one session; close() hands it back with release()
+    """
+
+    def __init__(self):
+        self._idle: Dict[PoolKey, deque] = {}
+        self._expiry: Dict[object, asyncio.TimerHandle] = {}
+
+    async def acquire(self, key: PoolKey):
+        """Return a live idle connection for key, or None when a new one must be opened"""
+        idle = self._idle.get(key)
+        while idle:
+            conn = idle.pop()
+            self._cancel_expiry(conn)
+            if not conn.is_closed():
+                logger.debug(f"复用SSH连接: {key[2]}@{key[0]}:{key[1]}")
+                return conn
+        self._idle.pop(key, None)
+        return None
+
+    async def release(self, key: PoolKey, conn) -> None:
+        """Keep conn idle for reuse; closes it when the pool for key is full or disabled"""
+        max_idle = settings.SSH_POOL_MAX_IDLE
+        idle = self._idle.setdefault(key, deque())
+        if conn.is_closed() or len(idle) >= max_idle:
+            if not idle:
+                del self._idle[key]
+            conn.close()
+            return
+
+        idle.append(conn)
+        self._expiry[conn] = asyncio.get_running_loop().call_later(
+            settings.SSH_POOL_IDLE_TIMEOUT, self._expire, key, conn
+        )
+
+    async def close_all(self) -> None:
+        """Close every idle connection"""
+        for idle in self._idle.values():
+            for conn in idle:
+                self._cancel_expiry(conn)
+                conn.close()
+        self._idle.clear()
+
+    def _expire(self, key: PoolKey, conn) -> None:
+        """Close a connection that stayed idle for SSH_POOL_IDLE_TIMEOUT"""
+        self._expiry.pop(conn, None)
+        idle = self._idle.get(key)
+        if idle and conn in idle:
+            idle.remove(conn)
+            if not idle:
+                del self._idle[key]
+        conn.close()
+
+    def _cancel_expiry(self, conn) -> None:
+        handle: Optional[asyncio.TimerHandle] = self._expiry.pop(conn, None)
+        if handle is not None:
+            handle.cancel()
+
+
+# Global SSH connection pool
+ssh_connection_pool = SSHConnectionPool()
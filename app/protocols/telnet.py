@@ -3,49 +3,132 @@ Telnet连接协议实现
 """
 
 import asyncio
+import codecs
+import functools
 import logging
 import telnetlib3
 import re
 from typing import Optional
 
+try:
+    # 编码探测器：优先使用C实现的 cchardet，缺失时回退到 chardet（两者接口一致）
+    from cchardet import UniversalDetector
+except ImportError:
+    try:
+        from chardet import UniversalDetector
+    except ImportError:
+        UniversalDetector = None
+
 from .base import ConnectionProtocol
 from ..core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# 登录提示和错误检测的正则表达式，导入时编译一次
+# 每一类合并为一个分支表达式，一次 search 即可检查该类全部模式
+_PATTERN_FLAGS = re.IGNORECASE | re.MULTILINE
+
+
+def _compile_patterns(patterns) -> re.Pattern:
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns), _PATTERN_FLAGS)
+
+
+CONNECTION_ERROR_RE = _compile_patterns((
+    r'telnet:.*: (Connection refused|No route to host|Connection timed out)',
+    r'connection refused by remote host',
+))
+
+USERNAME_RE = _compile_patterns((
+    r'(User name|User Name|username|Username|login|Login):?\s*$',
+    r'>>?\s*User\s+name:?\s*$',
+    r'Please\s+enter\s+(username|login):?\s*$',
+))
+
+PASSWORD_RE = _compile_patterns((
+    r'(password|Password):?\s*$',
+    r'>>?\s*User\s+password:?\s*$',
+    r'Please\s+enter\s+password:?\s*$',
+))
+
+LOGIN_ERROR_RE = _compile_patterns((
+    r'(Username or password invalid|Login incorrect)',
+    r'(has been locked|Account locked)',
+    r'Reenter times have reached the upper limit',
+    r'Authentication failed',
+    r'Invalid (username|password)',
+    r'Login failed',
+))
+
+# 预筛选关键字（小写）：每个错误模式都至少包含其中之一，不含任何关键字的数据块无需运行正则
+LOGIN_ERROR_KEYWORDS = ('invalid', 'login', 'locked', 'reenter', 'authentication')
+CONNECTION_ERROR_KEYWORDS = ('connection', 'no route')
+
+# 等待登录提示时只保留输出末尾的字符（提示总在最后一行），缓冲区不会随输出增长
+PROMPT_SCAN_TAIL_SIZE = 256
+
+# 后台读取每次最多读取的字符数
+TELNET_READ_SIZE = 64 * 1024
+
+# 登录期间缓存的输出块数，满时后台读取等待登录流程消费
+LOGIN_QUEUE_SIZE = 64
+
+# 发送密码后等待登录错误信息的时间（秒）
+LOGIN_ERROR_CHECK_SECONDS = 3
+
+# 关闭连接时依次尝试的退出命令
+LOGOUT_COMMANDS = ('logout\r\n', 'exit\r\n', 'quit\r\n')
+
+# 不超过该长度的非ASCII数据块（提示符、短回显）走解码缓存
+SMALL_CHUNK_CACHE_SIZE = 256
+
+
+def _decode_utf8_or_gbk(data: bytes) -> str:
+    """按UTF-8解码一次，失败时回退到GBK"""
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return data.decode('gbk', errors='replace')
+
+
+# 重复出现的短提示符（如带中文路径的 PS1）直接命中缓存
+_decode_small_chunk = functools.lru_cache(maxsize=64)(_decode_utf8_or_gbk)
+
+
+def _decode_server_bytes(data: bytes) -> str:
+    if len(data) <= SMALL_CHUNK_CACHE_SIZE:
+        return _decode_small_chunk(data)
+    return _decode_utf8_or_gbk(data)
+
+
+# 编码探测最多喂入的非ASCII字节数，超过后按当前探测结果固定编码
+ENCODING_DETECT_LIMIT = 4 * 1024
+
+# 连续多少个非ASCII数据块按UTF-8解码成功后固定使用UTF-8解码器
+UTF8_PIN_THRESHOLD = 8
+
+# 探测结果到实际解码器的映射（GB2312 按其超集 GBK 解码）
+_DETECTED_CODEC_ALIASES = {
+    'ascii': 'utf-8',
+    'gb2312': 'gbk',
+}
+
+
+def _normalize_detected_codec(encoding: Optional[str]) -> Optional[str]:
+    """把探测器给出的编码名规范化为可用的codec名称，无法识别时返回None"""
+    if not encoding:
+        return None
+    try:
+        name = codecs.lookup(encoding).name
+    except LookupError:
+        return None
+    return _DETECTED_CODEC_ALIASES.get(name, name)
+
 
 class TelnetProtocol(ConnectionProtocol):
     """
     使用telnetlib3的Telnet连接协议实现
     """
 
-    # 登录提示和错误检测的正则表达式模式
-    CONNECTION_ERROR_PATTERNS = [
-        r'telnet:.*: (Connection refused|No route to host|Connection timed out)',
-        r'connection refused by remote host',
-    ]
-
-    USERNAME_PATTERNS = [
-        r'(User name|User Name|username|Username|login|Login):?\s*$',
-        r'>>?\s*User\s+name:?\s*$',
-        r'Please\s+enter\s+(username|login):?\s*$',
-    ]
-
-    PASSWORD_PATTERNS = [
-        r'(password|Password):?\s*$',
-        r'>>?\s*User\s+password:?\s*$',
-        r'Please\s+enter\s+password:?\s*$',
-    ]
-
-    LOGIN_ERROR_PATTERNS = [
-        r'(Username or password invalid|Login incorrect)',
-        r'(has been locked|Account locked)',
-        r'Reenter times have reached the upper limit',
-        r'Authentication failed',
-        r'Invalid (username|password)',
-        r'Login failed',
-    ]
-
     def __init__(self, config):
         super().__init__(config)
         self.reader = None
@@ -55,19 +138,52 @@ class TelnetProtocol(ConnectionProtocol):
         self._last_error = None  # 保存最后的原始错误信息
         self._login_in_progress = False  # 登录进行中标志，用于控制认证错误检测
         self._shared_buffer = ''  # 共享缓冲区，供登录检测和后台读取使用
+        # 登录期间后台读取任务把原始输出（latin-1 文本）放入此队列，由登录流程消费（读取任务始终只有一个）
+        self._rx_queue = asyncio.Queue(maxsize=LOGIN_QUEUE_SIZE)
+        # 检测到认证错误或读取结束时置位，发送密码后的检查窗口可提前结束
+        self._login_check_done = asyncio.Event()
 
         # 设置服务器端编码，支持中文编码转换
         self.server_encoding = getattr(config, 'encoding', 'utf-8')
         if self.server_encoding.lower() in ['gbk', 'gb2312']:
             self.server_encoding = 'gbk'  # 统一使用gbk处理中文编码
 
-    def _is_utf8_bytes(self, data: bytes) -> bool:
-        """检测字节数据是否为有效的UTF-8编码"""
-        try:
-            data.decode('utf-8', errors='strict')
-            return True
-        except UnicodeDecodeError:
-            return False
+        # 编码自动探测：探测完成后固定编码，后续数据直接用增量解码器解码
+        # 探测完成前先按严格UTF-8增量解码，失败时回退到GBK
+        self._utf8_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._detect_bytes = 0
+        if self.server_encoding == 'gbk':
+            # 明确指定GBK时无需探测
+            self._detector = None
+            self._detected_codec = 'gbk'
+            self._decoder = codecs.getincrementaldecoder('gbk')(errors='replace')
+        else:
+            self._detector = UniversalDetector() if UniversalDetector is not None else None
+            self._detected_codec = None
+            self._decoder = None
+        self._utf8_streak = 0
+        # 后台读取调用的解码函数：编码确定后直接换成解码器的 decode（单次C调用，无Python分支）
+        self._decode = self._decoder.decode if self._decoder is not None else self._decode_bytes_with_auto_detection
+
+    def _feed_detector(self, data: bytes) -> None:
+        """把非ASCII数据喂给编码探测器，探测完成后固定会话编码并释放探测器"""
+        detector = self._detector
+        detector.feed(data)
+        self._detect_bytes += len(data)
+        if not detector.done and self._detect_bytes < ENCODING_DETECT_LIMIT:
+            return
+
+        detector.close()
+        self._detector = None
+        codec = _normalize_detected_codec(detector.result.get('encoding'))
+        if codec is None:
+            # 探测失败，继续使用 UTF-8→GBK 回退
+            return
+
+        self._detected_codec = codec
+        self._decoder = codecs.getincrementaldecoder(codec)(errors='replace')
+        self._decode = self._decoder.decode
+        logger.info(f"Telnet服务器编码探测结果: {codec}")
 
     def _decode_bytes_with_auto_detection(self, data: bytes) -> str:
         """从原始字节数据自动探测编码并转换为UTF-8"""
@@ -75,91 +191,75 @@ class TelnetProtocol(ConnectionProtocol):
         if not data:
             return ""
 
-        # 检测是否为UTF-8编码
-        if self._is_utf8_bytes(data):
-            # 如果是UTF-8，直接解码并返回
-            return data.decode('utf-8')
-        else:
-            # 如果不是UTF-8，假设是GBK并转换为UTF-8
-            try:
-                return data.decode('gbk', errors='replace')
-            except UnicodeDecodeError:
-                # 最后回退到Latin-1解码
-                return data.decode('latin-1', errors='replace')
-
-    def _recover_gbk_from_corrupted_string(self, data: str) -> str:
-        """尝试从包含替换字符的字符串中恢复GBK内容
-
-        telnetlib3 使用UTF-8解码GBK字节时会产生替换字符，
-        我们需要尝试其他方法来恢复原始内容
-        """
-        # 策略1: 直接保持替换字符，但提供更好的显示
-        # 替换字符 � 在终端中可能显示不正确，尝试替换为更明显的占位符
-        if '�' in data:
-            # 保持原始替换字符，让终端自己处理
-            return data
-
-        # 策略2: 如果没有替换字符，直接返回
-        return data
-
-    def _convert_server_output(self, data: str) -> str:
-        """将服务器输出从服务器编码转换为UTF-8供前端使用，自动探测编码"""
-        # 确保data是字符串类型
-        if data is None:
-            return ""
-        if not isinstance(data, str):
-            data = str(data)
+        # 编码已探测确定：增量解码器跨数据块保留多字节字符的状态
+        if self._decoder is not None:
+            return self._decoder.decode(data)
 
-        if not data:
-            return data
+        utf8_decoder = self._utf8_decoder
 
-        # 检查是否包含Unicode替换字符，这是telnetlib3错误解码GBK的标志
-        if '�' in data:
-            return self._recover_gbk_from_corrupted_string(data)
+        # 纯ASCII数据（最常见）：C层一次扫描即可确认，无需UTF-8探测
+        if not utf8_decoder.buffer and data.isascii():
+            return data.decode('ascii')
 
-        # 如果数据全部是ASCII字符（包括控制字符），不需要转换
-        try:
-            data.encode('ascii')
-            return data  # 纯ASCII数据，直接返回
-        except UnicodeEncodeError:
-            pass  # 包含非ASCII字符，需要转换
+        if self._detector is not None:
+            self._feed_detector(data)
+            if self._decoder is not None:
+                # 刚确定编码：连同UTF-8解码器中残留的字节一起交给新解码器
+                pending = utf8_decoder.getstate()[0]
+                utf8_decoder.reset()
+                return self._decoder.decode(pending + data)
 
-        # 自动探测和转换编码
+        # 先按UTF-8增量解码，失败再按GBK解码（只解码一次，不再单独探测）
         try:
-            # 检查数据是否所有字符都小于256（latin-1编码的特征）
-            if all(ord(char) < 256 for char in data):
-                # 将latin-1字符串转换回原始bytes
-                bytes_data = data.encode('latin-1')
-
-                # 首先检测是否为UTF-8
-                if self._is_utf8_bytes(bytes_data):
-                    # 如果是UTF-8，直接解码
-                    return bytes_data.decode('utf-8')
-                else:
-                    # 如果不是UTF-8，假设是GBK
-                    try:
-                        return bytes_data.decode('gbk', errors='replace')
-                    except UnicodeDecodeError:
-                        # 回退到原始数据
-                        return data
-            else:
-                return data
-
-        except (UnicodeDecodeError, UnicodeEncodeError):
-            return data
+            text = utf8_decoder.decode(data)
+        except UnicodeDecodeError:
+            self._utf8_streak = 0
+            pending = utf8_decoder.getstate()[0]
+            utf8_decoder.reset()
+            return _decode_server_bytes(pending + data)
+
+        self._utf8_streak += 1
+        if self._utf8_streak >= UTF8_PIN_THRESHOLD:
+            # 会话输出稳定为UTF-8：之后直接调用严格UTF-8解码器，不再探测
+            self._decode = utf8_decoder.decode
+            self._detector = None
+            logger.debug("Telnet服务器输出固定按UTF-8解码")
+        return text
+
+    def _unpin_utf8(self, data: bytes) -> str:
+        """固定UTF-8后收到非UTF-8数据：恢复自动探测，这一块按GBK解码"""
+        self._decode = self._decode_bytes_with_auto_detection
+        self._utf8_streak = 0
+        pending = self._utf8_decoder.getstate()[0]
+        self._utf8_decoder.reset()
+        return _decode_server_bytes(pending + data)
+
+    def _flush_decoder(self) -> str:
+        """输出结束时取出解码器中残留的不完整字符"""
+        if self._decoder is not None:
+            return self._decoder.decode(b'', final=True)
+        pending = self._utf8_decoder.getstate()[0]
+        self._utf8_decoder.reset()
+        return pending.decode('utf-8', errors='replace')
 
     async def connect(self) -> bool:
         """建立Telnet连接"""
+        # 配置项只读取一次
+        config = self.config
+        host = config.hostname
+        port = config.port
+        username = getattr(config, 'username', None)
+        password = getattr(config, 'password', None)
         try:
             # 连接到Telnet服务器
             # 设置终端类型以支持Tab补全等功能
-            terminal_type = getattr(self.config, 'terminal_type', 'xterm-256color')
+            terminal_type = getattr(config, 'terminal_type', 'xterm-256color')
 
             # 使用force_binary=True获取原始字节数据，然后手动处理编码转换
             self.reader, self.writer = await asyncio.wait_for(
                 telnetlib3.open_connection(
-                    host=self.config.hostname,
-                    port=self.config.port,
+                    host=host,
+                    port=port,
                     force_binary=True,  # 强制二进制模式，返回原始字节
                     encoding='latin-1',  # 设置默认编码，但force_binary会覆盖
                     connect_maxwait=settings.TELNET_TIMEOUT,
@@ -175,45 +275,39 @@ class TelnetProtocol(ConnectionProtocol):
 
             self.connected = True
 
+            # 如果提供了凭据，登录完成前的输出先交给登录流程
+            need_login = bool(username)
+            self._login_in_progress = need_login
+
             # 开始读取输出
             self._read_task = asyncio.create_task(self._read_output_async())
 
-            logger.info(f"Telnet connection established to {self.config.hostname}:{self.config.port}")
+            logger.info(f"Telnet connection established to {host}:{port}")
 
-            # 如果提供了凭据则处理登录
-            if hasattr(self.config, 'username') and self.config.username:
-                await self._handle_login()
+            if need_login:
+                await self._handle_login(username, password)
 
             return True
 
         except asyncio.TimeoutError:
-            logger.error(f"Telnet connection timeout to {self.config.hostname}:{self.config.port}")
-            raise ValueError(f"Connection timeout to {self.config.hostname}:{self.config.port}")
+            logger.error(f"Telnet connection timeout to {host}:{port}")
+            raise ValueError(f"Connection timeout to {host}:{port}")
         except OSError as e:
             logger.error(f"Telnet connection error: {str(e)}")
-            raise ValueError(f"Unable to connect to {self.config.hostname}:{self.config.port}: {str(e)}")
+            raise ValueError(f"Unable to connect to {host}:{port}: {str(e)}")
         except Exception as e:
             logger.error(f"Unexpected Telnet error: {str(e)}")
             raise ValueError(f"Connection failed: {str(e)}")
 
-    async def _handle_login(self):
+    async def _handle_login(self, username: str, password: Optional[str]):
         """使用正则表达式模式处理Telnet登录过程"""
         try:
-            # 设置登录进行中标志，暂停后台认证错误检测
+            # 设置登录进行中标志：后台读取任务把输出交给登录流程，暂停认证错误检测
             self._login_in_progress = True
 
-            # 暂停后台读取任务以避免数据竞争
-            if self._read_task and not self._read_task.done():
-                self._read_task.cancel()
-                try:
-                    await self._read_task
-                except asyncio.CancelledError:
-                    pass
-                logger.debug("暂停后台读取任务进行登录")
-
             # 等待用户名提示
             username_match = await self._wait_for_regex_patterns(
-                patterns=self.USERNAME_PATTERNS,
+                pattern=USERNAME_RE,
                 timeout=15,
                 description="username prompt"
             )
@@ -229,13 +323,13 @@ class TelnetProtocol(ConnectionProtocol):
                 logger.info(f"Found username prompt: {username_match}")
 
                 # 发送用户名
-                if hasattr(self.config, 'username') and self.config.username:
-                    await self.send_data(self.config.username + '\r\n')
-                    logger.debug(f"Sent username: {self.config.username}")
+                if username:
+                    await self.send_data(username + '\r\n')
+                    logger.debug(f"Sent username: {username}")
 
                     # 等待密码提示
                     password_match = await self._wait_for_regex_patterns(
-                        patterns=self.PASSWORD_PATTERNS,
+                        pattern=PASSWORD_RE,
                         timeout=10,
                         description="password prompt"
                     )
@@ -251,19 +345,19 @@ class TelnetProtocol(ConnectionProtocol):
                         logger.info(f"Found password prompt: {password_match}")
 
                         # 发送密码
-                        if hasattr(self.config, 'password') and self.config.password:
-                            await self.send_data(self.config.password + '\r\n')
+                        if password:
+                            await self.send_data(password + '\r\n')
                             logger.debug("Sent password")
 
-                            # 重新启用认证错误检测并重启后台读取任务
+                            # 后续输出直接转发，由后台读取任务实时检测认证错误
                             self._login_in_progress = False
-                            if not self.closed and self.reader:
-                                self._read_task = asyncio.create_task(self._read_output_async())
-                                logger.debug("密码发送后重启后台读取任务")
+                            self._drain_rx_queue()
 
-                            # 等待片刻并检查登录错误
-                            await asyncio.sleep(3)
-                            await self._check_login_errors()
+                            # 等待片刻并检查登录错误：后台读取检测到错误或连接结束时立即返回
+                            try:
+                                await asyncio.wait_for(self._login_check_done.wait(), timeout=LOGIN_ERROR_CHECK_SECONDS)
+                            except asyncio.TimeoutError:
+                                pass
 
                             # 检查是否在检查过程中发现认证失败
                             if self._authentication_failed:
@@ -286,219 +380,140 @@ class TelnetProtocol(ConnectionProtocol):
         finally:
             # 清除登录进行中标志，恢复后台认证错误检测
             self._login_in_progress = False
+            self._drain_rx_queue()
 
-            # 恢复后台读取任务(如果还没有启动的话)
-            if not self.closed and self.reader and (not self._read_task or self._read_task.done()):
-                self._read_task = asyncio.create_task(self._read_output_async())
-                logger.debug("恢复后台读取任务")
+    def _drain_rx_queue(self) -> None:
+        """丢弃登录流程未消费的输出，让等待入队的后台读取任务继续"""
+        while not self._rx_queue.empty():
+            self._rx_queue.get_nowait()
 
     async def _wait_for_prompt(self, prompts: list, timeout: int = 5):
         """等待输出中的特定提示"""
-        start_time = asyncio.get_event_loop().time()
         buffer = ''
 
-        # 将字节提示转换为字符串提示以适配telnetlib3
+        # 将字节提示转换为字符串提示（登录期间队列中是 latin-1 文本，与原始字节一一对应）
         string_prompts = []
         for prompt in prompts:
             if isinstance(prompt, bytes):
-                string_prompts.append(prompt.decode(self.encoding, errors='replace'))
+                string_prompts.append(prompt.decode('latin-1'))
             else:
                 string_prompts.append(prompt)
 
         logger.debug(f"Waiting for prompts: {string_prompts}")
 
-        while (asyncio.get_event_loop().time() - start_time) < timeout:
-            try:
-                data = await asyncio.wait_for(self.reader.read(1024), timeout=1.0)
-                if not data:
-                    break
+        # 全部提示合并为一个忽略大小写的表达式，无需每次把缓冲区转为小写
+        prompt_re = re.compile('|'.join(re.escape(prompt) for prompt in string_prompts), re.IGNORECASE)
+        # 只保留能与下一块拼出提示的尾部（最长提示长度-1），每次只扫描新数据
+        overlap = max((len(prompt) for prompt in string_prompts), default=1) - 1
 
-                # telnetlib3返回字符串数据
-                if isinstance(data, str):
-                    buffer += data
-                else:
-                    buffer += data.decode(self.encoding, errors='replace')
+        async def _scan() -> bool:
+            nonlocal buffer
+            while True:
+                # 后台读取任务转交的原始输出；空字符串表示连接已结束
+                data = await self._rx_queue.get()
+                if not data:
+                    return False
 
-                logger.debug(f"Received data: {repr(data)}")
-                logger.debug(f"Current buffer: {repr(buffer)}")
+                logger.debug("Received data: %r", data)
 
                 # Check if any prompt is found (case insensitive)
-                buffer_lower = buffer.lower()
-                for prompt in string_prompts:
-                    prompt_lower = prompt.lower()
-                    if prompt_lower in buffer_lower:
-                        logger.debug(f"Found prompt: '{prompt}' in buffer")
-                        return
-
-            except asyncio.TimeoutError:
-                continue
-            except Exception as e:
-                logger.debug(f"Error waiting for prompt: {str(e)}")
-                break
+                buffer += data
+                match = prompt_re.search(buffer)
+                if match:
+                    logger.debug(f"Found prompt: '{match.group(0)}' in buffer")
+                    return True
+
+                buffer = buffer[-overlap:] if overlap else ''
+
+        # 整个等待只用一个超时，不再每次读取都创建计时器
+        try:
+            if await asyncio.wait_for(_scan(), timeout=timeout):
+                return
+        except asyncio.TimeoutError:
+            pass
+        except Exception as e:
+            logger.debug(f"Error waiting for prompt: {str(e)}")
 
         logger.warning(f"Expected prompt not found. Buffer contents: {repr(buffer)}")
         raise ValueError("Expected prompt not found")
 
-    async def _wait_for_regex_patterns(self, patterns: list, timeout: int = 10, description: str = "pattern"):
-        """等待匹配给定正则表达式模式中任意一个的文本"""
-        start_time = asyncio.get_event_loop().time()
+    async def _wait_for_regex_patterns(self, pattern: re.Pattern, timeout: int = 10, description: str = "pattern"):
+        """等待匹配给定正则表达式（已编译的分支表达式）的文本"""
         buffer = ''
 
-        # 编译正则表达式模式以提高性能
-        compiled_patterns = []
-        for pattern in patterns:
-            try:
-                compiled_patterns.append(re.compile(pattern, re.IGNORECASE | re.MULTILINE))
-            except re.error as e:
-                logger.warning(f"Invalid regex pattern '{pattern}': {e}")
+        logger.debug(f"Waiting for {description}")
 
-        logger.debug(f"Waiting for {description} using {len(compiled_patterns)} patterns")
-
-        while (asyncio.get_event_loop().time() - start_time) < timeout:
-            try:
-                data = await asyncio.wait_for(self.reader.read(1024), timeout=1.0)
+        async def _scan() -> Optional[str]:
+            nonlocal buffer
+            while True:
+                # 后台读取任务转交的原始输出；空字符串表示连接已结束
+                data = await self._rx_queue.get()
                 if not data:
-                    break
-
-                # telnetlib3返回字符串数据，需要进行编码转换
-                if isinstance(data, str):
-                    converted_data = self._convert_server_output(data)
-                    buffer += converted_data
-                else:
-                    decoded_data = data.decode(self.server_encoding, errors='replace')
-                    buffer += decoded_data
+                    return None
 
-                logger.debug(f"Received data for {description}: {repr(data)}")
+                buffer += data
+                logger.debug("Received data for %s: %r", description, data)
 
                 # Check if any pattern matches
-                for pattern in compiled_patterns:
-                    match = pattern.search(buffer)
-                    if match:
-                        logger.debug(f"Found {description} match: '{match.group(0)}' using pattern: {pattern.pattern}")
-                        return match.group(0)
-
-            except asyncio.TimeoutError:
-                continue
-            except ConnectionResetError as e:
-                logger.warning(f"等待{description}时连接被重置: {str(e)}")
-                # 保存原始错误信息
-                self._last_error = f"等待{description}时连接被重置: {str(e)}"
-                # 连接已重置，标记为已断开并停止等待
-                self.connected = False
-                self.closed = True
-                return None
-            except (OSError, ConnectionError) as e:
-                if "Connection reset by peer" in str(e) or "Errno 54" in str(e):
-                    logger.warning(f"等待{description}时连接被对端重置: {str(e)}")
-                    # 保存原始错误信息
-                    self._last_error = f"等待{description}时连接被对端重置: {str(e)}"
-                    self.connected = False
-                    self.closed = True
-                    return None
-                else:
-                    logger.debug(f"等待{description}时发生错误: {str(e)}")
-                    break
-            except Exception as e:
-                logger.debug(f"等待{description}时发生未知错误: {str(e)}")
-                break
+                match = pattern.search(buffer)
+                if match:
+                    logger.debug(f"Found {description} match: '{match.group(0)}'")
+                    return match.group(0)
 
-        logger.warning(f"No {description} found in {timeout}s. Buffer contents: {repr(buffer[-200:])}")
-        return None
+                # 已扫描且未匹配的内容只需保留尾部，与下一块拼接后继续匹配
+                if len(buffer) > PROMPT_SCAN_TAIL_SIZE:
+                    buffer = buffer[-PROMPT_SCAN_TAIL_SIZE:]
 
-    async def _check_login_errors(self):
-        """检查登录错误消息"""
+        # 整个等待只用一个超时，不再每次读取都创建计时器
         try:
-            # 读取任何待处理的数据
-            buffer = ''
-            for _ in range(5):  # 检查5秒
-                try:
-                    data = await asyncio.wait_for(self.reader.read(1024), timeout=1.0)
-                    if data:
-                        if isinstance(data, str):
-                            converted_data = self._convert_server_output(data)
-                            buffer += converted_data
-                        else:
-                            decoded_data = data.decode(self.server_encoding, errors='replace')
-                            buffer += decoded_data
-                except asyncio.TimeoutError:
-                    continue
-                except ConnectionResetError as e:
-                    logger.warning(f"检查登录错误时连接被重置: {str(e)}")
-                    # 连接已重置，标记为已断开并停止检查
-                    self.connected = False
-                    self.closed = True
-                    return
-                except (OSError, ConnectionError) as e:
-                    if "Connection reset by peer" in str(e) or "Errno 54" in str(e):
-                        logger.warning(f"检查登录错误时连接被对端重置: {str(e)}")
-                        self.connected = False
-                        self.closed = True
-                        return
-                    else:
-                        logger.debug(f"检查登录错误时发生错误: {str(e)}")
-                        break
-                except Exception as e:
-                    logger.debug(f"检查登录错误时发生未知错误: {str(e)}")
-                    break
-
-            # Check for error patterns
-            for pattern_str in self.LOGIN_ERROR_PATTERNS:
-                try:
-                    pattern = re.compile(pattern_str, re.IGNORECASE | re.MULTILINE)
-                    match = pattern.search(buffer)
-                    if match:
-                        error_msg = f"检测到登录错误: {match.group(0)}"
-                        logger.error(error_msg)
-                        # 标记认证失败，停止重试
-                        self._authentication_failed = True
-                        self.connected = False
-                        self.closed = True
-                        raise ValueError(error_msg)
-                except re.error as e:
-                    logger.warning(f"Invalid error regex pattern '{pattern_str}': {e}")
-
-            logger.debug("No login errors detected")
-
+            matched = await asyncio.wait_for(_scan(), timeout=timeout)
+            if matched is not None:
+                return matched
+        except asyncio.TimeoutError:
+            pass
         except Exception as e:
-            logger.warning(f"Error checking login errors: {str(e)}")
+            logger.debug(f"等待{description}时发生未知错误: {str(e)}")
 
-    async def _check_data_for_auth_errors(self, data: str):
+        logger.warning(f"No {description} found in {timeout}s. Buffer contents: {repr(buffer[-200:])}")
+        return None
+
+    def _check_data_for_auth_errors(self, data: str) -> None:
         """检查数据中是否包含认证错误信息"""
         if self._authentication_failed or self._login_in_progress:
             return  # 已经标记为认证失败或登录进行中，无需检查
 
         try:
+            # 绝大多数数据块不含错误文本：先做子串预筛选，命中关键字才运行正则
+            lower = data.lower()
+
             # 检查是否包含认证错误模式
-            for pattern_str in self.LOGIN_ERROR_PATTERNS:
-                try:
-                    pattern = re.compile(pattern_str, re.IGNORECASE | re.MULTILINE)
-                    match = pattern.search(data)
-                    if match:
-                        error_msg = f"实时检测到认证错误: {match.group(0)}"
-                        logger.error(error_msg)
-                        # 标记认证失败，停止所有操作
-                        self._authentication_failed = True
-                        self.connected = False
-                        self.closed = True
-                        return
-                except re.error as e:
-                    logger.warning(f"Invalid error regex pattern '{pattern_str}': {e}")
+            match = None
+            if any(keyword in lower for keyword in LOGIN_ERROR_KEYWORDS):
+                match = LOGIN_ERROR_RE.search(data)
+            if match:
+                error_msg = f"实时检测到认证错误: {match.group(0)}"
+                logger.error(error_msg)
+                self._last_error = match.group(0)
+                # 标记认证失败，停止所有操作
+                self._authentication_failed = True
+                self._login_check_done.set()
+                self.connected = False
+                self.closed = True
+                return
 
             # 同时检查连接错误模式
-            for pattern_str in self.CONNECTION_ERROR_PATTERNS:
-                try:
-                    pattern = re.compile(pattern_str, re.IGNORECASE | re.MULTILINE)
-                    match = pattern.search(data)
-                    if match:
-                        error_msg = f"实时检测到连接错误: {match.group(0)}"
-                        logger.error(error_msg)
-                        # 标记连接失败，停止所有操作
-                        self._authentication_failed = True
-                        self.connected = False
-                        self.closed = True
-                        return
-                except re.error as e:
-                    logger.warning(f"Invalid connection error regex pattern '{pattern_str}': {e}")
+            if any(keyword in lower for keyword in CONNECTION_ERROR_KEYWORDS):
+                match = CONNECTION_ERROR_RE.search(data)
+            if match:
+                error_msg = f"实时检测到连接错误: {match.group(0)}"
+                logger.error(error_msg)
+                self._last_error = match.group(0)
+                # 标记连接失败，停止所有操作
+                self._authentication_failed = True
+                self._login_check_done.set()
+                self.connected = False
+                self.closed = True
+                return
 
         except Exception as e:
             logger.debug(f"Error checking data for auth errors: {str(e)}")
@@ -508,36 +523,40 @@ class TelnetProtocol(ConnectionProtocol):
         try:
             while not self.closed and self.reader:
                 try:
-                    data = await asyncio.wait_for(self.reader.read(4096), timeout=1.0)
+                    # 不再为每次读取设置超时：close() 取消本任务即可结束读取
+                    data = await self.reader.read(TELNET_READ_SIZE)
                     if not data:
                         # EOF received - server closed connection
                         logger.info("Telnet连接收到EOF，服务器已关闭连接")
                         self.connected = False
                         self.closed = True
+                        # 输出残留的不完整字符
+                        tail = self._flush_decoder()
+                        if tail:
+                            await self._queue_output(tail)
                         break
 
-                    # print(f"[TELNET DEBUG] _read_output_async received data type: {type(data)}, first 50 chars: {repr(data[:50] if data else '')}")
+                    # 登录进行中：原始数据交给登录流程匹配提示，不转发到WebSocket
+                    # 提示和错误模式都是ASCII，按 latin-1 文本（与原始字节一一对应）匹配即可，无需解码
+                    if self._login_in_progress:
+                        if isinstance(data, bytes):
+                            data = data.decode('latin-1')
+                        await self._rx_queue.put(data)
+                        continue
 
-                    if isinstance(data, bytes):
-                        # force_binary=True时，telnetlib3返回原始字节数据
-                        # With force_binary=True, telnetlib3 returns raw bytes data
-                        decoded_data = self._decode_bytes_with_auto_detection(data)
-                    else:
-                        # 如果意外收到字符串数据，转换回字节然后处理
-                        # If we unexpectedly receive string data, convert back to bytes then process
-                        logger.debug(f"Received string data when expecting bytes with force_binary=True")
-                        try:
-                            if isinstance(data, str):
-                                bytes_data = data.encode('latin-1')
-                                decoded_data = self._decode_bytes_with_auto_detection(bytes_data)
-                            else:
-                                decoded_data = self._convert_server_output(data)
-                        except UnicodeEncodeError:
-                            # 如果编码失败，直接使用字符串数据
-                            decoded_data = self._convert_server_output(data)
+                    if isinstance(data, str):
+                        # 字符串数据（latin-1 解码）先转换回原始字节（一一对应，不会失败）
+                        # String data (latin-1 decoded) goes back to the raw bytes
+                        data = data.encode('latin-1')
+
+                    # 只有固定后的严格UTF-8解码器会抛出 UnicodeDecodeError
+                    try:
+                        decoded_data = self._decode(data)
+                    except UnicodeDecodeError:
+                        decoded_data = self._unpin_utf8(data)
 
                     # 检查是否包含认证错误信息
-                    await self._check_data_for_auth_errors(decoded_data)
+                    self._check_data_for_auth_errors(decoded_data)
 
                     # 如果认证失败，停止读取
                     if self._authentication_failed:
@@ -547,10 +566,10 @@ class TelnetProtocol(ConnectionProtocol):
                     # 将数据排队传送到WebSocket
                     await self._queue_output(decoded_data)
 
-                except asyncio.TimeoutError:
-                    continue
                 except ConnectionResetError as e:
                     logger.warning(f"读取Telnet输出时连接被重置: {str(e)}")
+                    # 保存原始错误信息，供登录流程报告
+                    self._last_error = f"读取Telnet输出时连接被重置: {str(e)}"
                     # 连接已重置，标记为已断开并停止读取
                     self.connected = False
                     self.closed = True
@@ -558,6 +577,7 @@ class TelnetProtocol(ConnectionProtocol):
                 except (OSError, ConnectionError) as e:
                     if "Connection reset by peer" in str(e) or "Errno 54" in str(e):
                         logger.warning(f"读取Telnet输出时连接被对端重置: {str(e)}")
+                        self._last_error = f"读取Telnet输出时连接被对端重置: {str(e)}"
                         self.connected = False
                         self.closed = True
                         break
@@ -576,6 +596,13 @@ class TelnetProtocol(ConnectionProtocol):
                 logger.info("Telnet read task ended unexpectedly, marking connection as closed")
                 self.connected = False
                 self.closed = True
+            # 唤醒仍在等待登录提示或登录错误的流程
+            self._login_check_done.set()
+            if self._login_in_progress:
+                try:
+                    self._rx_queue.put_nowait('')
+                except asyncio.QueueFull:
+                    pass
             logger.debug("Telnet read task ended")
 
     async def send_data(self, data: str) -> None:
@@ -584,8 +611,8 @@ class TelnetProtocol(ConnectionProtocol):
             raise ValueError("Telnet连接未建立")
 
         try:
-            # 调试信息：记录传入的数据类型和内容
-            logger.debug(f"send_data called with: type={type(data)}, data={repr(data) if data is not None else 'None'}")
+            # 调试信息：记录传入的数据类型和内容（%-格式化延迟到日志实际输出时，未开启DEBUG时不计算repr）
+            logger.debug("send_data called with: type=%s, data=%r", type(data), data)
 
             # 确保data是字符串类型
             if data is None:
@@ -600,7 +627,7 @@ class TelnetProtocol(ConnectionProtocol):
             # Send string data directly (restore original logic)
             self.writer.write(data)
             await self.writer.drain()
-            logger.debug(f"已发送Telnet数据: {repr(data[:50])}")  # 记录前50个字符
+            logger.debug("已发送Telnet数据: %.50r", data)  # 记录前50个字符
         except ConnectionResetError as e:
             logger.warning(f"发送数据到Telnet时连接被重置: {str(e)}")
             # 连接已重置，标记为已断开
@@ -626,7 +653,8 @@ class TelnetProtocol(ConnectionProtocol):
             raise ValueError("Telnet连接未建立")
 
         try:
-            self.writer.write(data)
+            # writer 是 unicode 流，需按 send_data 的方式以字符串写入
+            self.writer.write(data.decode('utf-8', errors='replace'))
             await self.writer.drain()
         except ConnectionResetError as e:
             logger.warning(f"发送原始数据到Telnet时连接被重置: {str(e)}")
@@ -679,8 +707,9 @@ class TelnetProtocol(ConnectionProtocol):
             logger.debug("[TELNET_CLOSE] Connection already closed, skipping")
             return
 
-        logger.info(f"[TELNET_CLOSE] Starting Telnet connection close process")
-        logger.debug(f"[TELNET_CLOSE] Initial state - connected: {self.connected}, writer: {bool(self.writer)}, reader: {bool(self.reader)}")
+        logger.info("[TELNET_CLOSE] Starting Telnet connection close process")
+        logger.debug("[TELNET_CLOSE] Initial state - connected: %s, writer: %s, reader: %s",
+                     self.connected, self.writer is not None, self.reader is not None)
 
         self.closed = True
         self.connected = False
@@ -690,21 +719,13 @@ class TelnetProtocol(ConnectionProtocol):
             if self.writer and not self.writer.is_closing():
                 try:
                     logger.debug("[TELNET_CLOSE] Step 1: Sending logout commands to server")
-                    # 发送常见的退出命令
-                    logout_commands = ['logout\r\n', 'exit\r\n', 'quit\r\n']
-                    for i, cmd in enumerate(logout_commands):
-                        try:
-                            logger.debug(f"[TELNET_CLOSE] Step 1.{i+1}: Sending '{cmd.strip()}'")
-                            self.writer.write(cmd.encode())
-                            await self.writer.drain()
-                            await asyncio.sleep(0.1)  # 短暂等待命令处理
-                            logger.debug(f"[TELNET_CLOSE] Step 1.{i+1}: Command sent successfully")
-                        except Exception as e:
-                            logger.debug(f"[TELNET_CLOSE] Step 1.{i+1}: Command failed: {str(e)}")
-                            break  # 如果任何命令失败，停止尝试
+                    # 发送常见的退出命令：一次写入、一次drain（writer 是 unicode 流，按字符串写入）
+                    self.writer.writelines(LOGOUT_COMMANDS)
+                    # 对端不再读取时 drain 可能一直阻塞，限制等待时间以免拖慢关闭
+                    await asyncio.wait_for(self.writer.drain(), timeout=1.0)
                     logger.debug("[TELNET_CLOSE] Step 1: All logout commands sent")
                 except Exception as e:
-                    logger.debug(f"[TELNET_CLOSE] Step 1: ERROR sending logout commands: {str(e)}")
+                    logger.debug("[TELNET_CLOSE] Step 1: ERROR sending logout commands: %s", e)
 
             # 取消读取任务
             if self._read_task and not self._read_task.done():
@@ -723,9 +744,10 @@ class TelnetProtocol(ConnectionProtocol):
             if self.writer:
                 try:
                     logger.debug("[TELNET_CLOSE] Step 3: Closing writer")
-                    if not self.writer.is_closing():
-                        logger.debug("[TELNET_CLOSE] Step 3: Calling writer.close()")
-                        self.writer.close()
+                    # 对端已断开时 is_closing() 为真，但 wait_closed() 只在调用 close() 后返回；
+                    # close() 可重复调用，始终调用以免等待超时
+                    logger.debug("[TELNET_CLOSE] Step 3: Calling writer.close()")
+                    self.writer.close()
 
                     logger.debug("[TELNET_CLOSE] Step 3: Waiting for writer to close")
                     await asyncio.wait_for(self.writer.wait_closed(), timeout=2.0)
@@ -733,7 +755,7 @@ class TelnetProtocol(ConnectionProtocol):
                 except asyncio.TimeoutError:
                     logger.warning("[TELNET_CLOSE] Step 3: Writer close timeout, forcing termination")
                 except Exception as e:
-                    logger.debug(f"[TELNET_CLOSE] Step 3: ERROR closing writer: {str(e)}")
+                    logger.debug("[TELNET_CLOSE] Step 3: ERROR closing writer: %s", e)
             else:
                 logger.debug("[TELNET_CLOSE] Step 3: No writer to close")
 
@@ -747,7 +769,7 @@ class TelnetProtocol(ConnectionProtocol):
             logger.info("[TELNET_CLOSE] Telnet connection close process completed successfully")
 
         except Exception as e:
-            logger.error(f"关闭Telnet连接时发生错误: {str(e)}")
+            logger.error("关闭Telnet连接时发生错误: %s", e)
             # 即使出错也要确保状态被清理
             self.writer = None
             self.reader = None
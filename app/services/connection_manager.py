@@ -4,12 +4,17 @@ Handles active terminal connections and their lifecycle
 """
 
 import asyncio
+import heapq
 import logging
-from typing import Dict, Optional
-from datetime import datetime
+import time
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
+# get_stats 快照的缓存时间（秒）；连接增减会立即使缓存失效
+STATS_CACHE_TTL = 0.25
+
 
 class ConnectionManager:
     """
@@ -18,92 +23,138 @@ class ConnectionManager:
 
     def __init__(self):
         self.connections: Dict[str, any] = {}
-        self.connection_stats = {
-            "total_connections": 0,
-            "active_connections": 0
-        }
-
-    async def add_connection(self, connection_id: str, connection):
+        self.total_connections = 0
+        # 最后活动时间（单调时钟秒）单独存放；最小堆按入堆时的时间排序，
+        # 活动只更新字典，过期检查时再把已更新的条目重新入堆（惰性失效）
+        self._last_activity: Dict[str, float] = {}
+        self._idle_heap: List[Tuple[float, str]] = []
+        # 连接增减时递增，用于判断 get_stats 缓存是否仍然有效
+        self._stats_version = 0
+        self._cached_stats: Optional[dict] = None
+        self._cached_stats_version = -1
+        self._cached_stats_ts = 0.0
+
+    @property
+    def active_connections(self) -> int:
+        """Number of registered connections"""
+        return len(self.connections)
+
+    def add_connection(self, connection_id: str, connection):
         """Add a new connection"""
+        now = time.monotonic()
         self.connections[connection_id] = {
             "connection": connection,
-            "created_at": datetime.utcnow(),
-            "last_activity": datetime.utcnow()
+            "created_at": datetime.utcnow()
         }
-        self.connection_stats["total_connections"] += 1
-        self.connection_stats["active_connections"] += 1
+        self._last_activity[connection_id] = now
+        heapq.heappush(self._idle_heap, (now, connection_id))
+        self.total_connections += 1
+        self._stats_version += 1
 
-        logger.info(f"Connection {connection_id} added. Active: {self.connection_stats['active_connections']}")
+        logger.info("Connection %s added. Active: %d", connection_id, self.active_connections)
 
-    async def get_connection(self, connection_id: str):
+    def get_connection(self, connection_id: str):
         """Get a connection by ID"""
-        if connection_id in self.connections:
-            self.connections[connection_id]["last_activity"] = datetime.utcnow()
-            return self.connections[connection_id]["connection"]
-        return None
+        info = self.connections.get(connection_id)
+        if info is None:
+            return None
+        self._last_activity[connection_id] = time.monotonic()
+        return info["connection"]
 
     async def remove_connection(self, connection_id: str):
         """Remove and clean up a connection"""
-        logger.debug(f"[CONN_MGR] Starting removal of connection {connection_id}")
+        logger.debug("[CONN_MGR] Starting removal of connection %s", connection_id)
 
         if connection_id in self.connections:
             connection_info = self.connections[connection_id]
             connection = connection_info["connection"]
 
-            logger.debug(f"[CONN_MGR] Connection found - Type: {type(connection).__name__}")
-            logger.debug(f"[CONN_MGR] Connection details: {connection_info}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[CONN_MGR] Connection found - Type: %s", type(connection).__name__)
+                logger.debug("[CONN_MGR] Connection details: %r", connection_info)
 
             try:
-                logger.debug(f"[CONN_MGR] Step 1: Calling close() on {type(connection).__name__} connection")
+                logger.debug("[CONN_MGR] Step 1: Calling close() on %s connection", type(connection).__name__)
                 # Close the underlying protocol connection (Telnet/SSH)
                 await connection.close()
-                logger.debug(f"[CONN_MGR] Step 1: Protocol connection closed successfully")
+                logger.debug("[CONN_MGR] Step 1: Protocol connection closed successfully")
             except Exception as e:
-                logger.error(f"[CONN_MGR] Step 1: ERROR closing protocol connection {connection_id}: {str(e)}")
+                logger.error("[CONN_MGR] Step 1: ERROR closing protocol connection %s: %s", connection_id, e)
 
             # Remove from active connections
-            logger.debug(f"[CONN_MGR] Step 2: Removing from active connections dictionary")
-            del self.connections[connection_id]
-            self.connection_stats["active_connections"] -= 1
-            logger.debug(f"[CONN_MGR] Step 2: Removed successfully. Active connections: {self.connection_stats['active_connections']}")
-
-            logger.info(f"[CONN_MGR] Connection {connection_id} removal completed. Active connections: {self.connection_stats['active_connections']}")
+            logger.debug("[CONN_MGR] Step 2: Removing from active connections dictionary")
+            # close() 期间可能已被并发移除，pop 避免重复删除
+            self.connections.pop(connection_id, None)
+            self._last_activity.pop(connection_id, None)
+            self._stats_version += 1
+            logger.debug("[CONN_MGR] Step 2: Removed successfully. Active connections: %d", self.active_connections)
+
+            logger.info("[CONN_MGR] Connection %s removal completed. Active connections: %d",
+                        connection_id, self.active_connections)
         else:
-            logger.warning(f"[CONN_MGR] Attempted to remove non-existent connection: {connection_id}")
-            logger.debug(f"[CONN_MGR] Available connections: {list(self.connections.keys())}")
-            logger.warning(f"尝试移除不存在的连接: {connection_id}")
-
-    async def get_stats(self):
-        """Get connection statistics"""
-        return {
-            "active_connections": self.connection_stats["active_connections"],
-            "total_connections": self.connection_stats["total_connections"],
+            logger.warning("[CONN_MGR] Attempted to remove non-existent connection: %s", connection_id)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[CONN_MGR] Available connections: %s", list(self.connections))
+            logger.warning("尝试移除不存在的连接: %s", connection_id)
+
+    def get_stats(self):
+        """Get connection statistics (shared snapshot, cached for STATS_CACHE_TTL; do not mutate)"""
+        now = time.monotonic()
+        if (self._cached_stats is not None
+                and self._cached_stats_version == self._stats_version
+                and now - self._cached_stats_ts < STATS_CACHE_TTL):
+            return self._cached_stats
+
+        # 单调时钟只在序列化时换算成墙上时间，两个时钟各取一次
+        wall_now = datetime.utcnow()
+        self._cached_stats = {
+            "active_connections": self.active_connections,
+            "total_connections": self.total_connections,
             "connections": [
                 {
                     "id": conn_id,
                     "created_at": info["created_at"],
-                    "last_activity": info["last_activity"]
+                    "last_activity": wall_now - timedelta(seconds=now - self._last_activity.get(conn_id, now))
                 }
                 for conn_id, info in self.connections.items()
             ]
         }
+        self._cached_stats_version = self._stats_version
+        self._cached_stats_ts = now
+        return self._cached_stats
 
     async def cleanup_inactive_connections(self, max_idle_minutes: int = 60):
         """Clean up connections that have been inactive for too long"""
-        current_time = datetime.utcnow()
+        cutoff = time.monotonic() - max_idle_minutes * 60
+        heap = self._idle_heap
         inactive_connections = []
 
-        for conn_id, info in self.connections.items():
-            idle_time = (current_time - info["last_activity"]).total_seconds() / 60
-            if idle_time > max_idle_minutes:
-                inactive_connections.append(conn_id)
+        # 只弹出堆顶早于 cutoff 的条目，不再扫描全部连接
+        while heap and heap[0][0] < cutoff:
+            stamp, conn_id = heapq.heappop(heap)
+            last_activity = self._last_activity.get(conn_id)
+            if last_activity is None:
+                continue  # already removed
+            if last_activity > stamp:
+                heapq.heappush(heap, (last_activity, conn_id))  # touched since it was queued
+                continue
+            del self._last_activity[conn_id]
+            inactive_connections.append(conn_id)
 
         for conn_id in inactive_connections:
-            logger.info(f"Cleaning up inactive connection {conn_id}")
-            await self.remove_connection(conn_id)
+            logger.info("Cleaning up inactive connection %s", conn_id)
+
+        # 并发关闭，总耗时取决于最慢的一个连接而不是所有连接之和
+        results = await asyncio.gather(
+            *(self.remove_connection(conn_id) for conn_id in inactive_connections),
+            return_exceptions=True
+        )
+        for conn_id, result in zip(inactive_connections, results):
+            if isinstance(result, Exception):
+                logger.error("Failed to clean up inactive connection %s: %s", conn_id, result)
 
         return len(inactive_connections)
 
-    async def get_active_connection_count(self):
+    def get_active_connection_count(self):
         """Get the number of active connections"""
-        return len(self.connections)
\ No newline at end of file
+        return self.active_connections
\ No newline at end of file
@@ -4,35 +4,61 @@ Cryptographic utilities for encrypting sensitive data
 
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+import asyncio
 import base64
+import functools
 import os
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
 
 from ..core.config import settings
 
+# Prefix marking values encrypted with AES-GCM (values without it are legacy Fernet tokens)
+_GCM_PREFIX = "gcm:"
+_GCM_NONCE_SIZE = 12
+
+_KDF_SALT = b'webxterm_salt_2024'  # In production, use a random salt per installation
+
+
+@functools.lru_cache(maxsize=4)
+def _derive_master_key(secret: bytes, salt: bytes, iterations: int) -> bytes:
+    """PBKDF2-HMAC-SHA256 key derivation, memoized per (secret, salt, iterations)"""
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=iterations,
+    )
+    return kdf.derive(secret)
+
 
 class CryptoService:
     """Service for encrypting and decrypting sensitive data"""
 
     def __init__(self):
         self._fernet = None
+        self._aesgcm = None
         self._initialize_crypto()
 
     def _initialize_crypto(self):
         """Initialize encryption key"""
-        # Use secret key to derive encryption key
-        password = settings.SECRET_KEY.encode()
-        salt = b'webxterm_salt_2024'  # In production, use a random salt per installation
+        # Use secret key to derive encryption key (PBKDF2 只对同一 SECRET_KEY 计算一次)
+        master_key = _derive_master_key(settings.SECRET_KEY.encode(), _KDF_SALT, settings.PBKDF2_ITERATIONS)
+        self._fernet = Fernet(base64.urlsafe_b64encode(master_key))
 
-        kdf = PBKDF2HMAC(
+        # AES-GCM 使用由主密钥派生的独立子密钥（OpenSSL 自动使用 AES-NI/PCLMULQDQ 加速）
+        gcm_key = HKDF(
             algorithm=hashes.SHA256(),
             length=32,
-            salt=salt,
-            iterations=100000,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password))
-        self._fernet = Fernet(key)
+            salt=None,
+            info=b'webxterm-aes-gcm',
+        ).derive(master_key)
+        self._aesgcm = AESGCM(gcm_key)
 
     def encrypt(self, data: str) -> str:
         """Encrypt a string"""
@@ -40,8 +66,9 @@ class CryptoService:
             return ""
 
         try:
-            encrypted_data = self._fernet.encrypt(data.encode('utf-8'))
-            return base64.urlsafe_b64encode(encrypted_data).decode('utf-8')
+            nonce = os.urandom(_GCM_NONCE_SIZE)
+            encrypted_data = self._aesgcm.encrypt(nonce, data.encode('utf-8'), None)
+            return _GCM_PREFIX + base64.urlsafe_b64encode(nonce + encrypted_data).decode('utf-8')
         except Exception as e:
             raise ValueError(f"Encryption failed: {str(e)}")
 
@@ -51,12 +78,28 @@ class CryptoService:
             return ""
 
         try:
-            decoded_data = base64.urlsafe_b64decode(encrypted_data.encode('utf-8'))
-            decrypted_data = self._fernet.decrypt(decoded_data)
+            if encrypted_data.startswith(_GCM_PREFIX):
+                decoded_data = base64.urlsafe_b64decode(encrypted_data[len(_GCM_PREFIX):].encode('utf-8'))
+                nonce, ciphertext = decoded_data[:_GCM_NONCE_SIZE], decoded_data[_GCM_NONCE_SIZE:]
+                decrypted_data = self._aesgcm.decrypt(nonce, ciphertext, None)
+            else:
+                # Legacy Fernet token written by earlier versions
+                decoded_data = base64.urlsafe_b64decode(encrypted_data.encode('utf-8'))
+                decrypted_data = self._fernet.decrypt(decoded_data)
             return decrypted_data.decode('utf-8')
         except Exception as e:
             raise ValueError(f"Decryption failed: {str(e)}")
 
+    def encrypt_many(self, values: Iterable[Optional[str]]) -> List[Optional[str]]:
+        """Encrypt several strings with the shared cipher (empty values become None)"""
+        encrypt = self.encrypt
+        return [encrypt(value) if value else None for value in values]
+
+    def decrypt_many(self, values: Iterable[Optional[str]]) -> List[Optional[str]]:
+        """Decrypt several strings with the shared cipher (empty values become None)"""
+        decrypt = self.decrypt
+        return [decrypt(value) if value else None for value in values]
+
 
 # Global crypto service instance
 _crypto_service = CryptoService()
@@ -73,4 +116,80 @@ def decrypt_data(encrypted_data: Optional[str]) -> Optional[str]:
     """Decrypt sensitive data"""
     if not encrypted_data:
         return None
-    return _crypto_service.decrypt(encrypted_data)
\ No newline at end of file
+    return _crypto_service.decrypt(encrypted_data)
+
+
+def upgrade_ciphertext(encrypted_data: Optional[str]) -> Optional[str]:
+    """
+    Re-encrypt a legacy Fernet value (a Fernet token base64-encoded a second time) as AES-GCM
+    Returns None when the value is already current or cannot be decrypted with this SECRET_KEY
+    """
+    if not encrypted_data or encrypted_data.startswith(_GCM_PREFIX):
+        return None
+    try:
+        return _crypto_service.encrypt(_crypto_service.decrypt(encrypted_data))
+    except ValueError:
+        return None
+
+
+async def encrypt_many_async(values: Iterable[Optional[str]]) -> List[Optional[str]]:
+    """Encrypt a batch in the default thread pool, keeping the event loop free"""
+    # 先在事件循环线程中取出全部值，避免在线程中迭代调用方的生成器
+    values = list(values)
+    return await asyncio.get_running_loop().run_in_executor(None, _crypto_service.encrypt_many, values)
+
+
+# 解密结果缓存：LRU + 过期时间，明文密码/私钥不会无限期留在内存中
+DECRYPT_CACHE_SIZE = 128
+DECRYPT_CACHE_TTL = 300  # seconds
+
+# ciphertext -> (expires_at, plaintext); keyed by ciphertext so updated secrets miss the cache
+_decrypt_cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+_decrypt_cache_lock = threading.Lock()
+
+
+def decrypt_many_cached(values: Iterable[Optional[str]]) -> List[Optional[str]]:
+    """
+    Decrypt a batch of sensitive values (empty values become None) through the decrypt cache
+    Cache hits are served under one lock acquisition; misses are decrypted together
+    """
+    values = list(values)
+    results: List[Optional[str]] = [None] * len(values)
+    misses = []
+
+    now = time.monotonic()
+    with _decrypt_cache_lock:
+        for index, encrypted_data in enumerate(values):
+            if not encrypted_data:
+                continue
+            entry = _decrypt_cache.get(encrypted_data)
+            if entry is not None:
+                if entry[0] > now:
+                    _decrypt_cache.move_to_end(encrypted_data)
+                    results[index] = entry[1]
+                    continue
+                del _decrypt_cache[encrypted_data]
+            misses.append(index)
+
+    if not misses:
+        return results
+
+    plaintexts = _crypto_service.decrypt_many(values[index] for index in misses)
+
+    expires_at = now + DECRYPT_CACHE_TTL
+    with _decrypt_cache_lock:
+        for index, plaintext in zip(misses, plaintexts):
+            results[index] = plaintext
+            _decrypt_cache[values[index]] = (expires_at, plaintext)
+            _decrypt_cache.move_to_end(values[index])
+        while len(_decrypt_cache) > DECRYPT_CACHE_SIZE:
+            _decrypt_cache.popitem(last=False)
+    return results
+
+
+def forget_decrypted(encrypted_values: Iterable[Optional[str]]) -> None:
+    """Drop cached plaintexts for these ciphertexts (secrets of deleted or updated sessions)"""
+    with _decrypt_cache_lock:
+        for encrypted_data in encrypted_values:
+            if encrypted_data:
+                _decrypt_cache.pop(encrypted_data, None)
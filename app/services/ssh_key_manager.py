@@ -3,22 +3,69 @@ SSH Key Manager Service
 """
 
 import uuid
+import sqlite3
+import functools
 import hashlib
 import base64
 from datetime import datetime
-from typing import List, Optional
+from typing import Iterable, List, Optional
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.backends import default_backend
 
-from ..core.database import DatabaseManager
+from ..core.database import db_manager, SQL_NOW_ISO
 from ..models.ssh_key import SSHKeyCreate, SSHKeyUpdate, SSHKeyResponse, SSHKeyWithSecret
 
 
+def _sha256_fingerprint(data: bytes) -> str:
+    """OpenSSH-style fingerprint: SHA256:<unpadded base64 digest>"""
+    return 'SHA256:' + base64.b64encode(hashlib.sha256(data).digest()).rstrip(b'=').decode('ascii')
+
+
+@functools.lru_cache(maxsize=64)
+def _parse_private_key_cached(private_key: str):
+    """
+    Parse an unencrypted private key (OpenSSH or PEM); None when it cannot be loaded
+    Memoized so bulk create/update of the same keys only runs the cryptography parsers once
+    """
+    key_bytes = private_key.encode('utf-8')
+    # 根据 PEM 头选择解析器，只调用一次（OpenSSH 解析器失败前会先完整解析一遍）
+    if b'OPENSSH PRIVATE KEY' in key_bytes[:64]:
+        loader = serialization.load_ssh_private_key
+    else:
+        loader = serialization.load_pem_private_key
+    try:
+        return loader(key_bytes, password=None, backend=default_backend())
+    except Exception:
+        # Encrypted keys, unsupported formats
+        return None
+
+
+def _fingerprint_from_private_key(private_key: str) -> str:
+    """
+    Fingerprint of the public key derived from private_key (same format as ssh-keygen -l)
+    Unparseable keys hash the key text instead
+    """
+    private_key_obj = _parse_private_key_cached(private_key)
+    if private_key_obj is not None:
+        try:
+            # Serialize public key in OpenSSH format and hash the base64-decoded key blob
+            public_key_bytes = private_key_obj.public_key().public_bytes(
+                encoding=serialization.Encoding.OpenSSH,
+                format=serialization.PublicFormat.OpenSSH
+            )
+            return _sha256_fingerprint(base64.b64decode(public_key_bytes.split()[1]))
+        except Exception:
+            pass
+
+    # Fallback: use hash of private key
+    return _sha256_fingerprint(private_key.encode('utf-8'))
+
+
 class SSHKeyManager:
     """Manage SSH keys"""
 
     def __init__(self):
-        self.db = DatabaseManager()
+        self.db = db_manager
         self._init_table()
 
     def _init_table(self):
@@ -41,49 +88,7 @@ class SSHKeyManager:
 
     def _calculate_fingerprint(self, private_key: str) -> str:
         """Calculate SSH key fingerprint"""
-        try:
-            # Try to load the key to validate it and extract public key
-            key_bytes = private_key.encode('utf-8')
-
-            # Try different key formats
-            try:
-                # Try OpenSSH format
-                private_key_obj = serialization.load_ssh_private_key(
-                    key_bytes,
-                    password=None,
-                    backend=default_backend()
-                )
-            except:
-                # Try PEM format
-                try:
-                    private_key_obj = serialization.load_pem_private_key(
-                        key_bytes,
-                        password=None,
-                        backend=default_backend()
-                    )
-                except:
-                    # If all fail, use a hash of the key content
-                    return hashlib.md5(key_bytes).hexdigest()
-
-            # Get public key
-            public_key = private_key_obj.public_key()
-
-            # Serialize public key in OpenSSH format
-            public_key_bytes = public_key.public_bytes(
-                encoding=serialization.Encoding.OpenSSH,
-                format=serialization.PublicFormat.OpenSSH
-            )
-
-            # Calculate MD5 fingerprint
-            key_data = base64.b64decode(public_key_bytes.split()[1])
-            fingerprint = hashlib.md5(key_data).hexdigest()
-
-            # Format as xx:xx:xx:...
-            return ':'.join(fingerprint[i:i+2] for i in range(0, len(fingerprint), 2))
-
-        except Exception as e:
-            # Fallback: use hash of private key
-            return hashlib.md5(private_key.encode('utf-8')).hexdigest()
+        return _fingerprint_from_private_key(private_key)
 
     async def create_key(self, key_data: SSHKeyCreate) -> SSHKeyResponse:
         """Create a new SSH key"""
@@ -94,14 +99,11 @@ class SSHKeyManager:
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
 
-            # Check if name already exists
-            cursor.execute('SELECT id FROM ssh_keys WHERE name = ?', (key_data.name,))
-            if cursor.fetchone():
-                raise ValueError(f"SSH key with name '{key_data.name}' already exists")
-
+            # 名称冲突时不插入（依赖 name 的 UNIQUE 索引），省去先查询再插入的一次往返
             cursor.execute('''
                 INSERT INTO ssh_keys (id, name, private_key, passphrase, description, fingerprint, created_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO NOTHING
             ''', (
                 key_id,
                 key_data.name,
@@ -111,6 +113,8 @@ class SSHKeyManager:
                 fingerprint,
                 now
             ))
+            if cursor.rowcount == 0:
+                raise ValueError(f"SSH key with name '{key_data.name}' already exists")
             conn.commit()
 
         return SSHKeyResponse(
@@ -122,6 +126,68 @@ class SSHKeyManager:
             last_used=None
         )
 
+    async def create_keys_bulk(self, keys: Iterable[SSHKeyCreate]) -> List[SSHKeyResponse]:
+        """Create many SSH keys in a single transaction (all or nothing)"""
+        keys = list(keys)
+        if not keys:
+            return []
+
+        # Names must be unique within the batch; clashes with stored keys are caught by the UNIQUE index
+        names = [key_data.name for key_data in keys]
+        seen = set()
+        for name in names:
+            if name in seen:
+                raise ValueError(f"SSH key with name '{name}' already exists")
+            seen.add(name)
+
+        now = datetime.utcnow().isoformat()
+        rows = [
+            (
+                str(uuid.uuid4()),
+                key_data.name,
+                key_data.private_key,
+                key_data.passphrase,
+                key_data.description,
+                self._calculate_fingerprint(key_data.private_key),
+                now
+            )
+            for key_data in keys
+        ]
+
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+
+            # 一次 executemany + 一次提交，批量导入只 fsync 一次
+            try:
+                cursor.executemany('''
+                    INSERT INTO ssh_keys (id, name, private_key, passphrase, description, fingerprint, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+            except sqlite3.IntegrityError as e:
+                # 撤销整批插入；只有名称与已有密钥冲突时才报告为重名，其他约束错误原样抛出
+                conn.rollback()
+                cursor.execute(
+                    f"SELECT name FROM ssh_keys WHERE name IN ({', '.join('?' * len(names))})",
+                    names
+                )
+                existing = cursor.fetchone()
+                if existing is None:
+                    raise
+                raise ValueError(f"SSH key with name '{existing[0]}' already exists") from e
+            conn.commit()
+
+        return [
+            SSHKeyResponse(
+                id=row[0],
+                name=row[1],
+                description=row[4],
+                fingerprint=row[5],
+                created_at=now,
+                last_used=None
+            )
+            for row in rows
+        ]
+
     async def get_all_keys(self) -> List[SSHKeyResponse]:
         """Get all SSH keys (without private keys)"""
         with self.db.get_connection() as conn:
@@ -175,9 +241,10 @@ class SSHKeyManager:
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
 
-            # Check if key exists
-            cursor.execute('SELECT id FROM ssh_keys WHERE id = ?', (key_id,))
-            if not cursor.fetchone():
+            # Check if key exists (an unchanged private key keeps its stored fingerprint)
+            cursor.execute('SELECT private_key FROM ssh_keys WHERE id = ?', (key_id,))
+            current = cursor.fetchone()
+            if not current:
                 return None
 
             # Build update query
@@ -185,15 +252,10 @@ class SSHKeyManager:
             params = []
 
             if key_data.name is not None:
-                # Check if new name already exists
-                cursor.execute('SELECT id FROM ssh_keys WHERE name = ? AND id != ?',
-                             (key_data.name, key_id))
-                if cursor.fetchone():
-                    raise ValueError(f"SSH key with name '{key_data.name}' already exists")
                 update_fields.append('name = ?')
                 params.append(key_data.name)
 
-            if key_data.private_key is not None:
+            if key_data.private_key is not None and key_data.private_key != current[0]:
                 update_fields.append('private_key = ?')
                 params.append(key_data.private_key)
                 # Recalculate fingerprint if key changed
@@ -215,7 +277,13 @@ class SSHKeyManager:
 
             params.append(key_id)
             query = f'UPDATE ssh_keys SET {", ".join(update_fields)} WHERE id = ?'
+            if key_data.name is not None:
+                # The row exists, so no update means the new name belongs to another key
+                query += ' AND NOT EXISTS (SELECT 1 FROM ssh_keys WHERE name = ? AND id != ?)'
+                params.extend((key_data.name, key_id))
             cursor.execute(query, params)
+            if cursor.rowcount == 0:
+                raise ValueError(f"SSH key with name '{key_data.name}' already exists")
             conn.commit()
 
             return await self.get_key_response(key_id)
@@ -255,9 +323,30 @@ class SSHKeyManager:
         """Update last used timestamp"""
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
+            cursor.execute(f'''
+                UPDATE ssh_keys
+                SET last_used = {SQL_NOW_ISO}
+                WHERE id = ?
+            ''', (key_id,))
+            conn.commit()
+
+    async def update_last_used_many(self, key_ids: Iterable[str]):
+        """Update last used timestamp of several keys with one commit"""
+        params = [(key_id,) for key_id in key_ids]
+        if not params:
+            return
+
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(f'''
                 UPDATE ssh_keys
-                SET last_used = ?
+                SET last_used = {SQL_NOW_ISO}
                 WHERE id = ?
-            ''', (datetime.utcnow().isoformat(), key_id))
+            ''', params)
             conn.commit()
+
+
+@functools.lru_cache(maxsize=1)
+def get_ssh_key_manager() -> SSHKeyManager:
+    """Dependency function that returns the shared SSH key manager"""
+    return SSHKeyManager()
@@ -0,0 +1,40 @@
+"""
+Identifier generation utilities
+"""
+
+import secrets
+import threading
+import uuid
+
+# 每次从系统熵源读取的字节数（可生成 256 个 ID）
+_ENTROPY_POOL_SIZE = 4096
+_ID_SIZE = 16
+
+_pool = b''
+_offset = 0
+_lock = threading.Lock()
+
+
+def _random_uuid() -> uuid.UUID:
+    """
+    Build a random (version 4) UUID from a pooled block of entropy
+    Refills the pool with one secrets.token_bytes() call every 256 IDs
+    """
+    global _pool, _offset
+    with _lock:
+        if _offset + _ID_SIZE > len(_pool):
+            _pool = secrets.token_bytes(_ENTROPY_POOL_SIZE)
+            _offset = 0
+        chunk = _pool[_offset:_offset + _ID_SIZE]
+        _offset += _ID_SIZE
+    return uuid.UUID(bytes=chunk, version=4)
+
+
+def new_connection_id() -> str:
+    """Generate a connection ID (32 hex characters, no dashes)"""
+    return _random_uuid().hex
+
+
+def new_session_id() -> str:
+    """Generate a session ID in the canonical dashed UUID form used by stored sessions"""
+    return str(_random_uuid())
@@ -13,6 +13,8 @@ export class ConnectionManager {
         this.reconnectAttempts = 0;
         this.maxReconnectAttempts = 3;
         this.reconnectDelay = 1000;
+        // Keystrokes are sent as binary frames (UTF-8), JSON is reserved for control messages
+        this.textEncoder = new TextEncoder();
     }
 
     init() {
@@ -197,8 +199,7 @@ export class ConnectionManager {
         }
 
         try {
-            const message = JSON.stringify({ data });
-            this.websocket.send(message);
+            this.websocket.send(this.textEncoder.encode(data));
         } catch (error) {
             console.error('Error sending data:', error);
             this.emit('error', error);
@@ -6,11 +6,16 @@ webXTerm development server startup script
 
 import os
 import sys
-import subprocess
+import json
 import argparse
 import signal
+import select
 import time
+import atexit
+import queue
 import logging
+import logging.handlers
+from importlib.util import find_spec
 from pathlib import Path
 
 # Add app to Python path
@@ -19,6 +24,79 @@ app_path = os.path.join(script_dir, "app")
 frontend_path = os.path.join(script_dir, "frontend")
 sys.path.insert(0, script_dir)  # Add root directory to path
 
+# 轮询间隔（秒）：从很短开始逐步加长，用完后重复最后一个值（不超过调用方给的上限）
+POLL_DELAYS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0)
+
+def wait_until(condition, timeout, max_delay=0.5):
+    """Poll condition() with growing delays until it returns a truthy value or timeout expires"""
+    deadline = time.monotonic() + timeout
+    delays = iter(POLL_DELAYS)
+    while True:
+        result = condition()
+        remaining = deadline - time.monotonic()
+        if result or remaining <= 0:
+            return result
+        time.sleep(min(next(delays, max_delay), max_delay, remaining))
+
+def is_process_running(pid):
+    """Check whether a process with this PID exists"""
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+def disable_inherited_fds():
+    """
+    Mark file descriptors inherited from the launching process (other than stdio) close-on-exec
+    Python's own fds are already non-inheritable; this keeps stray inherited ones out of the
+    shells spawned by local terminal sessions
+    """
+    if os.name == "nt":
+        return
+    fd_dir = "/proc/self/fd" if os.path.isdir("/proc/self/fd") else "/dev/fd"
+    try:
+        fds = [int(fd) for fd in os.listdir(fd_dir)]
+    except OSError:
+        return
+    for fd in fds:
+        if fd > 2:
+            try:
+                os.set_inheritable(fd, False)
+            except OSError:
+                pass  # the fd used by listdir() itself is already closed
+
+def ensure_parent_dirs(*paths):
+    """Create the parent directories of the given file paths once (None entries are skipped)"""
+    for directory in {os.path.dirname(os.path.abspath(path)) for path in paths if path}:
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            # 创建失败时由写入对应文件的地方报告错误
+            logging.getLogger().debug(f"Cannot create directory {directory}: {e}")
+
+def wait_for_exit(pid, timeout, max_delay=0.5):
+    """
+    Wait until process pid has exited; returns True if it did within timeout
+    Linux: a pidfd becomes readable the moment the process exits; elsewhere poll with backoff
+    """
+    if hasattr(os, "pidfd_open"):
+        try:
+            pidfd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            pidfd = None
+        if pidfd is not None:
+            try:
+                poller = select.poll()
+                poller.register(pidfd, select.POLLIN)
+                return bool(poller.poll(timeout * 1000))
+            finally:
+                os.close(pidfd)
+
+    return wait_until(lambda: not is_process_running(pid), timeout, max_delay=max_delay)
+
 def get_default_paths():
     """Get default paths for webXTerm"""
     base_dir = Path(__file__).parent
@@ -30,23 +108,47 @@ def get_default_paths():
         "args_file": str(data_dir / "webxterm.args")
     }
 
+def queue_file_handler(file_handler):
+    """
+    Wrap file_handler so logging calls only enqueue; a QueueListener thread does the file writes
+    The listener thread does not survive fork(), so it is stopped (drained) before daemonize()
+    forks and restarted in both processes
+    """
+    log_queue = queue.Queue(-1)
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(before=listener.stop, after_in_parent=listener.start, after_in_child=listener.start)
+    return logging.handlers.QueueHandler(log_queue)
+
+LOG_LEVEL_MAP = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+    'critical': logging.CRITICAL
+}
+
+LOG_FORMATTER = logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+# Arguments of the last setup_logging() call in this process
+_logging_setup = None
+
 def setup_logging(log_level="warning", log_file=None, daemon_mode=False):
-    """Setup logging"""
-    level_map = {
-        'debug': logging.DEBUG,
-        'info': logging.INFO,
-        'warning': logging.WARNING,
-        'error': logging.ERROR,
-        'critical': logging.CRITICAL
-    }
+    """Setup logging (repeated calls with the same arguments keep the current handlers)"""
+    global _logging_setup
 
-    log_level_obj = level_map.get(log_level.lower(), logging.WARNING)
+    logger = logging.getLogger()
+    if _logging_setup == (log_level, log_file, daemon_mode):
+        return logger
+    _logging_setup = (log_level, log_file, daemon_mode)
 
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    log_level_obj = LOG_LEVEL_MAP.get(log_level.lower(), logging.WARNING)
+    formatter = LOG_FORMATTER
 
-    logger = logging.getLogger()
     logger.setLevel(log_level_obj)
 
     # Clear existing handlers
@@ -56,16 +158,15 @@ def setup_logging(log_level="warning", log_file=None, daemon_mode=False):
     if daemon_mode and log_file:
         # Daemon mode: write to log file
         try:
-            os.makedirs(os.path.dirname(log_file), exist_ok=True)
             handler = logging.FileHandler(log_file)
             handler.setFormatter(formatter)
-            logger.addHandler(handler)
+            logger.addHandler(queue_file_handler(handler))
         except Exception as e:
             # Fallback to current directory
             fallback_log = Path(__file__).parent / "webxterm.log"
             handler = logging.FileHandler(fallback_log)
             handler.setFormatter(formatter)
-            logger.addHandler(handler)
+            logger.addHandler(queue_file_handler(handler))
             logger.error(f"Cannot write to log file {log_file}: {e}, using fallback {fallback_log}")
     else:
         # Foreground mode: output to console
@@ -75,28 +176,39 @@ def setup_logging(log_level="warning", log_file=None, daemon_mode=False):
 
     return logger
 
+REQUIRED_MODULES = ("uvicorn", "fastapi", "asyncssh", "telnetlib3")
+
 def check_dependencies():
     """Check if required dependencies are installed"""
-    try:
-        import uvicorn
-        import fastapi
-        import paramiko
-        import telnetlib3
-        print("✅ All required dependencies are installed")
-        return True
-    except ImportError as e:
-        print("❌ Missing dependency: {}".format(e))
+    # find_spec 只查找模块，不执行模块代码（服务启动时才真正导入）
+    missing = [name for name in REQUIRED_MODULES if find_spec(name) is None]
+    if missing:
+        print("❌ Missing dependency: {}".format(", ".join(missing)))
         print("Please install dependencies with: pip install -r requirements.txt")
         return False
+    print("✅ All required dependencies are installed")
+    return True
+
+# PID file path -> ((st_ino, st_size, st_mtime_ns), pid); only the parsed content is cached,
+# whether the process is still alive is checked on every call
+_pid_file_cache = {}
 
 def check_pid_file(pid_file):
     """Check if PID file exists and process is running"""
-    if not os.path.exists(pid_file):
+    try:
+        st = os.stat(pid_file)
+    except OSError:
         return None
 
     try:
-        with open(pid_file, 'r') as f:
-            pid = int(f.read().strip())
+        file_key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        cached = _pid_file_cache.get(pid_file)
+        if cached is not None and cached[0] == file_key:
+            pid = cached[1]
+        else:
+            with open(pid_file, 'r') as f:
+                pid = int(f.read().strip())
+            _pid_file_cache[pid_file] = (file_key, pid)
 
         # Check if process exists
         try:
@@ -110,15 +222,32 @@ def check_pid_file(pid_file):
         return None
 
 def write_pid_file(pid_file, pid):
-    """Write PID file"""
+    """Write PID file (fails if a running process already holds it)"""
+    logger = logging.getLogger()
     try:
         pid_file = os.path.abspath(pid_file)
-        os.makedirs(os.path.dirname(pid_file), exist_ok=True)
-        with open(pid_file, 'w') as f:
-            f.write(str(pid))
-        return True
-    except IOError as e:
-        logger = logging.getLogger()
+        for attempt in range(2):
+            try:
+                # O_EXCL: 检查与创建是同一个原子操作，同时启动的两个实例只有一个能写入
+                fd = os.open(pid_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except FileExistsError:
+                holder = check_pid_file(pid_file)
+                if holder is not None:
+                    logger.error(f"PID file {pid_file} is held by running process {holder}")
+                    return False
+                if attempt:
+                    raise
+                # Stale PID file left by a dead process: remove it and retry once
+                remove_pid_file(pid_file)
+                continue
+
+            try:
+                os.write(fd, str(pid).encode())
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            return True
+    except OSError as e:
         logger.error(f"Cannot write PID file {pid_file}: {e}")
         return False
 
@@ -138,6 +267,8 @@ def daemonize(log_file=None):
         # First fork
         pid = os.fork()
         if pid > 0:
+            # 回收第二次 fork 后立即退出的中间进程，避免在容器 PID 1 下留下僵尸进程
+            os.waitpid(pid, 0)
             sys.exit(0)
     except OSError as e:
         logger.error(f"First fork failed: {e}")
@@ -174,7 +305,6 @@ def daemonize(log_file=None):
         # Redirect stdout/stderr to log file or /dev/null
         if log_file:
             try:
-                os.makedirs(os.path.dirname(log_file), exist_ok=True)
                 with open(log_file, 'a') as f:
                     os.dup2(f.fileno(), sys.stdout.fileno())
                     os.dup2(f.fileno(), sys.stderr.fileno())
@@ -205,30 +335,23 @@ def stop_daemon(pid_file):
         print(f"🛑 Stopping process {pid}...")
         os.kill(pid, signal.SIGTERM)
 
-        # Wait for process to stop
-        for _ in range(30):  # Wait up to 30 seconds
-            try:
-                os.kill(pid, 0)
-                time.sleep(1)
-            except OSError:
-                print("✅ Process stopped")
-                remove_pid_file(pid_file)
-                return True
+        # Wait up to 30 seconds for process to stop
+        if wait_for_exit(pid, 30, max_delay=1.0):
+            print("✅ Process stopped")
+            remove_pid_file(pid_file)
+            return True
 
         # Force stop
         print("⚠️  Process didn't respond to SIGTERM, using SIGKILL...")
         try:
             os.kill(pid, signal.SIGKILL)
-            time.sleep(2)
 
-            try:
-                os.kill(pid, 0)
+            if not wait_for_exit(pid, 2):
                 print("❌ Cannot stop process")
                 return False
-            except OSError:
-                print("✅ Process forcefully stopped")
-                remove_pid_file(pid_file)
-                return True
+            print("✅ Process forcefully stopped")
+            remove_pid_file(pid_file)
+            return True
         except OSError:
             print("✅ Process stopped")
             remove_pid_file(pid_file)
@@ -245,15 +368,15 @@ def stop_daemon(pid_file):
 def save_start_args(args_file, args):
     """Save startup arguments for restart"""
     try:
-        os.makedirs(os.path.dirname(args_file), exist_ok=True)
         with open(args_file, 'w') as f:
-            f.write(f"port={args.port}\n")
-            f.write(f"debug={args.debug}\n")
-            f.write(f"verb={args.verb}\n")
-            f.write(f"daemon={args.daemon}\n")
-            f.write(f"pid_file={args.pid_file}\n")
-            if args.log_file:
-                f.write(f"log_file={args.log_file}\n")
+            json.dump({
+                "port": args.port,
+                "debug": args.debug,
+                "verb": args.verb,
+                "daemon": args.daemon,
+                "pid_file": args.pid_file,
+                "log_file": args.log_file
+            }, f)
         return True
     except Exception as e:
         logging.error(f"Cannot save args file {args_file}: {e}")
@@ -265,9 +388,14 @@ def load_start_args(args_file):
         return None
 
     try:
-        args = {}
         with open(args_file, 'r') as f:
-            for line in f:
+            content = f.read()
+        try:
+            args = json.loads(content)
+        except ValueError:
+            # 旧版本写入的 key=value 格式
+            args = {}
+            for line in content.splitlines():
                 if '=' in line:
                     key, value = line.strip().split('=', 1)
                     if key in ['debug', 'verb', 'daemon']:
@@ -276,7 +404,8 @@ def load_start_args(args_file):
                         args[key] = int(value)
                     else:
                         args[key] = value
-        return args
+        # log_file 未设置时保存为 null
+        return {key: value for key, value in args.items() if value is not None}
     except Exception as e:
         logging.error(f"Cannot load args file {args_file}: {e}")
         return None
@@ -292,13 +421,11 @@ def restart_daemon(args_file, pid_file):
     print("🔄 Restarting webXTerm daemon...")
     print(f"   Using saved arguments: port={saved_args.get('port', 8080)}, debug={saved_args.get('debug', False)}")
 
-    # Stop current daemon
+    # Stop current daemon (returns once the old process has exited; uvicorn is killed with it,
+    # so there is nothing left to wait for before starting again)
     if not stop_daemon(pid_file):
         print("⚠️  Warning: Failed to stop existing daemon, attempting to start anyway...")
 
-    # Wait a moment for cleanup
-    time.sleep(2)
-
     # Start with saved arguments
     log_level = "warning"
     if saved_args.get('debug', False):
@@ -307,6 +434,7 @@ def restart_daemon(args_file, pid_file):
         log_level = "info"
 
     logger = setup_logging(log_level, daemon_mode=False)
+    ensure_parent_dirs(saved_args.get('pid_file', pid_file), saved_args.get('log_file'))
     success = start_daemon(
         saved_args.get('pid_file', pid_file),
         port=saved_args.get('port', 8080),
@@ -369,12 +497,16 @@ def start_daemon(pid_file, port=8080, log_level="warning", log_file=None):
                 # Setup signal handlers
                 def signal_handler(signum, frame):
                     daemon_logger.info(f"Received signal: {signum}")
-                    if signum == signal.SIGTERM:
-                        daemon_logger.info("Received SIGTERM, stopping...")
+                    if signum in (signal.SIGTERM, signal.SIGINT):
+                        daemon_logger.info(f"Received {signal.Signals(signum).name}, stopping...")
                         remove_pid_file(pid_file)
                         sys.exit(0)
+                    else:
+                        # uvicorn 只接管 SIGINT/SIGTERM；其他停止信号转成 SIGTERM，走同样的正常关闭流程
+                        os.kill(os.getpid(), signal.SIGTERM)
 
-                signal.signal(signal.SIGTERM, signal_handler)
+                for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGQUIT):
+                    signal.signal(sig, signal_handler)
                 daemon_logger.info("Signal handlers setup completed")
 
                 # Start webXTerm service
@@ -388,17 +520,21 @@ def start_daemon(pid_file, port=8080, log_level="warning", log_file=None):
                     logging.error(f"Daemon startup failed: {e}")
                 sys.exit(1)
         else:
-            # Parent process
+            # Parent process (reap the child, which exits as soon as daemonize() has forked)
             logger.info(f"Parent process waiting for child startup (child PID: {child_pid})")
-            time.sleep(3)  # Give more time for child process initialization
-
-            pid = check_pid_file(pid_file)
+            os.waitpid(child_pid, 0)
+            # 轮询 PID 文件，子进程写入后立即返回（最多等待 5 秒）
+            pid = wait_until(lambda: check_pid_file(pid_file), 5)
             if pid:
-                print(f"✅ webXTerm daemon started (PID: {pid})")
-                print(f"📝 webXTerm: http://127.0.0.1:{port}")
-                print(f"📝 API Docs: http://127.0.0.1:{port}/docs")
+                # 横幅拼成一次 print（一次写入）
+                banner = (
+                    f"✅ webXTerm daemon started (PID: {pid})\n"
+                    f"📝 webXTerm: http://127.0.0.1:{port}\n"
+                    f"📝 API Docs: http://127.0.0.1:{port}/docs"
+                )
                 if log_file:
-                    print(f"📝 Log file: {log_file}")
+                    banner += f"\n📝 Log file: {log_file}"
+                print(banner)
                 logger.info(f"Daemon startup successful (PID: {pid})")
                 return True
             else:
@@ -420,10 +556,12 @@ def start_server(port=8080, log_level="warning", daemon_mode=False, app_dir=None
             return
 
     if not daemon_mode:
-        print(f"\n🚀 Starting webXTerm server...")
-        print(f"   webXTerm: http://127.0.0.1:{port}")
-        print(f"   API Docs: http://127.0.0.1:{port}/docs")
-        print(f"\n   Press Ctrl+C to stop the server\n")
+        print(
+            f"\n🚀 Starting webXTerm server...\n"
+            f"   webXTerm: http://127.0.0.1:{port}\n"
+            f"   API Docs: http://127.0.0.1:{port}/docs\n"
+            f"\n   Press Ctrl+C to stop the server\n"
+        )
 
     # Set environment variables
     os.environ["ENVIRONMENT"] = "development"
@@ -437,14 +575,8 @@ def start_server(port=8080, log_level="warning", daemon_mode=False, app_dir=None
         # Ensure we're in the project root directory
         os.chdir(script_dir)
 
-    # Start uvicorn server (app is now in root directory)
-    cmd = [
-        sys.executable, "-m", "uvicorn",
-        "app.main:app",
-        "--host", "127.0.0.1",
-        "--port", str(port),
-        "--log-level", log_level
-    ]
+    # Select event loop (uvloop if enabled and installed)
+    from app.core.loop import get_loop_impl
 
     # 在debug模式下，确保应用程序日志级别也是debug
     if log_level == "debug":
@@ -454,7 +586,17 @@ def start_server(port=8080, log_level="warning", daemon_mode=False, app_dir=None
             logging.getLogger(module_name).setLevel(logging.DEBUG)
 
     try:
-        subprocess.run(cmd)
+        # 在当前进程内运行 uvicorn（app is now in root directory），不再启动新的解释器重新导入依赖；
+        # uvicorn 退出时会恢复原有信号处理器并重新触发收到的信号，守护进程的 SIGTERM 处理仍然生效
+        import uvicorn
+        config = uvicorn.Config(
+            "app.main:app",
+            host="127.0.0.1",
+            port=port,
+            log_level=log_level,
+            loop=get_loop_impl()
+        )
+        uvicorn.Server(config).run()
     except KeyboardInterrupt:
         if not daemon_mode:
             print("\n✅ webXTerm server stopped")
@@ -465,7 +607,10 @@ def start_server(port=8080, log_level="warning", daemon_mode=False, app_dir=None
             print(f"❌ Failed to start server: {e}")
         sys.exit(1)
 
+STARTUP_BANNER = "🚀 webXTerm Server\n" + "=" * 40
+
 def main():
+    disable_inherited_fds()
     defaults = get_default_paths()
 
     parser = argparse.ArgumentParser(description="Start webXTerm development server")
@@ -505,10 +650,12 @@ def main():
         restart_daemon(defaults["args_file"], args.pid_file)
         return
 
-    print("🚀 webXTerm Server")
-    print("=" * 40)
+    print(STARTUP_BANNER)
 
     if args.daemon:
+        # 守护进程要写入的 PID/日志/参数文件目录在这里统一创建
+        ensure_parent_dirs(defaults["args_file"], args.pid_file, args.log_file)
+
         # Save arguments for future restart
         save_start_args(defaults["args_file"], args)
 
@@ -527,9 +674,8 @@ def main():
         # Check if daemon is already running
         existing_pid = check_pid_file(args.pid_file)
         if existing_pid:
-            print(f"⚠️  Daemon is already running (PID: {existing_pid})")
-            print(f"   To stop: python start.py --stop")
-            print()
+            print(f"⚠️  Daemon is already running (PID: {existing_pid})\n"
+                  f"   To stop: python start.py --stop\n")
 
         # Start server in foreground
         start_server(